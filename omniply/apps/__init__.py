@@ -3,6 +3,6 @@ from .simple import flag, cond
 from .templating import Template, FileTemplate
 # from .iterative import *
 from .decisions import *
-from .gaps import Gapped, Gauged, DictGadget, Table
+from .gaps import Gapped, Gauged, DictGadget, Table, ArrayTable, HDF5Table, NpyDirTable
 # from .guides import AbstractGuru, AbstractMogul, MutableGuru, Guru
 # from .mechanisms import Mechanism, SimpleMechanism
\ No newline at end of file
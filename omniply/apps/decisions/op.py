@@ -19,7 +19,7 @@ class _OldController(Context, CertificateGaggle, NaiveConsiderationBase):
 
 class Controller(Context, CarefulDecider, CertificateGaggle):
 	def create_case(self, cache: dict[str, Any] = None, chain: Chain = None) -> AbstractCase:
-		return super().create_case(cache, chain=chain).extend(list(self.vendors()))
+		return super().create_case(cache, chain=chain)._share_vendors(self)
 
 
 
@@ -89,12 +89,14 @@ class GaugedGaggle(MutableGaggle, Gauged):
 	def gauge_apply(self: Self, gauge: GAUGE) -> Self:
 		'''Applies the gauge to the GaugedGaggle.'''
 		super().gauge_apply(gauge)
+		self._own_vendors()
 		for gadget in self.vendors():
 			if isinstance(gadget, AbstractGauged):
 				gadget.gauge_apply(gauge)
 		table = {gauge.get(gizmo, gizmo): gadgets for gizmo, gadgets in self._gadgets_table.items()}
 		self._gadgets_table.clear()
 		self._gadgets_table.update(table)
+		self._vendors_changed()
 		return self
 
 	def gauge_clear(self):
@@ -265,7 +267,8 @@ class StaticGearCraft(Gapped, _StaticGearCraft): # TODO: only change is gives()
 
 
 
-from .simple import DictGadget as _DictGadget, Table as _Table
+from .simple import (DictGadget as _DictGadget, Table as _Table, ArrayTable as _ArrayTable,
+					 HDF5Table as _HDF5Table, NpyDirTable as _NpyDirTable)
 
 
 
@@ -323,6 +326,21 @@ class Table(Gapped, _Table): # TODO: unit test this
 
 
 
+class ArrayTable(Table, _ArrayTable):
+	pass
+
+
+
+class HDF5Table(Table, _HDF5Table):
+	pass
+
+
+
+class NpyDirTable(Table, _NpyDirTable):
+	pass
+
+
+
 
 
 
@@ -1,5 +1,7 @@
-from typing import Any, Iterator, Callable, Optional
+from typing import Any, Iterator, Callable, Optional, Union, Mapping
 from collections import UserDict
+from pathlib import Path
+import threading
 from omnibelt import filter_duplicates
 
 # from collections import frozenset
@@ -152,6 +154,270 @@ class Table(GeneticGadget):
 
 
 
+def gather_rows(column: Any, index: Any) -> Any:
+	'''selects the rows `index` (an int, slice, or array of ints) from the array `column`'''
+	import numpy as np
+	if isinstance(index, (int, np.integer, slice)):
+		return column[index]
+	index = np.asarray(index)
+	if index.ndim == 1 and len(index) > 1 and index.dtype.kind in 'iu':
+		start, stop = int(index[0]), int(index[-1]) + 1
+		# (negative or out of range indices are left to numpy, since a slice would silently select other rows)
+		if 0 <= start and stop <= len(column) and stop - start == len(index) and (np.diff(index) == 1).all():
+			return column[start:stop] # contiguous, so no copy is necessary
+	return column[index]
+
+
+
+class ArrayTable(Table):
+	'''
+	table where each column is a numpy array (optionally memory-mapped from a `.npy` file), so a batch of indices
+	is gathered with a single vectorized read per column (and contiguous ranges are zero-copy slices)
+
+	dtypes are inferred automatically from the values (e.g. from `from_rows` or `from_columns`)
+	'''
+	def __init__(self, data_in_columns: dict[str, Any] = None, **kwargs):
+		if data_in_columns is not None:
+			data_in_columns = self._as_arrays(data_in_columns)
+		super().__init__(data_in_columns, **kwargs)
+
+
+	@classmethod
+	def from_rows(cls, rows: list[dict[str, Any]], **kwargs) -> 'ArrayTable':
+		return cls(cls._validate_rows(rows), **kwargs)
+
+
+	@classmethod
+	def from_columns(cls, columns: dict[str, list[Any]], **kwargs) -> 'ArrayTable':
+		return cls(cls._validate_columns(columns), **kwargs)
+
+
+	@classmethod
+	def from_npy(cls, paths: Union[str, Path, Mapping[str, Union[str, Path]]], *, mmap_mode: Optional[str] = 'r',
+				 **kwargs) -> 'ArrayTable':
+		'''
+		loads the columns from `.npy` files (by default memory-mapped, so only the rows which are used are read)
+
+		`paths` is either a directory (where each `.npy` file is a column) or a mapping from column name to file
+		'''
+		if not isinstance(paths, Mapping):
+			paths = {path.stem: path for path in sorted(Path(paths).glob('*.npy'))}
+		import numpy as np
+		return cls({col: np.load(path, mmap_mode=mmap_mode) for col, path in paths.items()}, **kwargs)
+
+
+	def to_npy(self, root: Union[str, Path]) -> dict[str, Path]:
+		'''saves each column as a `.npy` file in the directory `root` (see `from_npy`)'''
+		import numpy as np
+		self.load()
+		root = Path(root)
+		root.mkdir(parents=True, exist_ok=True)
+		paths = {}
+		for col in self.columns:
+			paths[col] = root / f'{col}.npy'
+			np.save(paths[col], self.data[col], allow_pickle=self.data[col].dtype == object)
+		return paths
+
+
+	@staticmethod
+	def _as_array(values: Any) -> 'np.ndarray':
+		import numpy as np
+		if isinstance(values, np.ndarray):
+			return values
+		try:
+			return np.asarray(values)
+		except ValueError: # ragged values (e.g. sequences of different lengths)
+			arr = np.empty(len(values), dtype=object)
+			for i, value in enumerate(values):
+				arr[i] = value
+			return arr
+
+
+	@classmethod
+	def _as_arrays(cls, columns: dict[str, Any]) -> dict[str, 'np.ndarray']:
+		return {col: cls._as_array(values) for col, values in columns.items()}
+
+
+	def load(self):
+		if not self.is_loaded:
+			super().load()
+			if self.is_loaded:
+				self.data = self._as_arrays(self.data)
+		return self
+
+
+	def gather(self, col: str, index: Any) -> Any:
+		'''selects the rows `index` (an int, slice, or array of ints) from column `col`'''
+		return gather_rows(self.data[col], index)
+
+
+	def grab_from(self, ctx: 'AbstractGame', gizmo: str) -> Any:
+		index = ctx.grab(self._index_gizmo) if self._index_attribute is None else getattr(ctx, self._index_attribute)
+		return self.gather(gizmo, index)
+
+
+	def __getitem__(self, index: int):
+		self.load()
+		return {col: self.gather(col, index) for col in self.columns}
+
+
+
+class ChunkedTable(ArrayTable):
+	'''
+	table whose columns stay on disk (e.g. HDF5 datasets or memory-mapped `.npy` files) and are only read on demand
+
+	the source is opened lazily (on first use), only the columns that are actually grabbed are read, and only the
+	chunks (blocks of `chunk_size` rows) containing the requested rows are read, in sorted order. the most recently
+	used `cache_chunks` chunks are kept in memory, so repeated epochs don't read them again.
+	'''
+	def __init__(self, *, chunk_size: int = 4096, cache_chunks: Optional[int] = 256, **kwargs):
+		super().__init__(**kwargs)
+		self.chunk_size = chunk_size
+		self.cache_chunks = cache_chunks
+		self._chunks = {} # (col, chunk) -> array (in order of use)
+		self._chunks_lock = threading.Lock()
+		self.chunk_hits = 0
+		self.chunk_reads = 0
+
+
+	def load(self):
+		Table.load(self) # columns are kept on disk (rather than converted to arrays)
+		return self
+
+
+	@property
+	def columns(self) -> list[str]:
+		self.load()
+		return super().columns
+
+
+	def clear_chunks(self):
+		with self._chunks_lock:
+			self._chunks.clear()
+
+
+	def _read_chunk(self, col: str, chunk: int) -> 'np.ndarray':
+		import numpy as np
+		key = col, chunk
+		with self._chunks_lock:
+			if key in self._chunks:
+				self.chunk_hits += 1
+				self._chunks[key] = self._chunks.pop(key) # mark as most recently used
+				return self._chunks[key]
+		start = chunk * self.chunk_size
+		values = np.asarray(self.data[col][start:start + self.chunk_size])
+		with self._chunks_lock:
+			self.chunk_reads += 1
+			if self.cache_chunks is None or self.cache_chunks > 0:
+				self._chunks[key] = values
+				if self.cache_chunks is not None and len(self._chunks) > self.cache_chunks:
+					del self._chunks[next(iter(self._chunks))]
+		return values
+
+
+	def gather(self, col: str, index: Any) -> Any:
+		import numpy as np
+		self.load()
+		if isinstance(index, slice):
+			index = np.arange(*index.indices(self.number_of_rows))
+		if isinstance(index, (int, np.integer)):
+			index = int(index) + (self.number_of_rows if index < 0 else 0)
+			return self._read_chunk(col, index // self.chunk_size)[index % self.chunk_size]
+		index = np.asarray(index, dtype=np.int64)
+		index = np.where(index < 0, index + self.number_of_rows, index)
+		chunks = index // self.chunk_size
+		order = np.argsort(chunks, kind='stable')
+		sorted_chunks = chunks[order]
+		bounds = np.flatnonzero(np.diff(sorted_chunks)) + 1
+		out = None
+		for sel in np.split(order, bounds) if len(order) else []:
+			chunk = int(chunks[sel[0]])
+			values = self._read_chunk(col, chunk)[index[sel] - chunk * self.chunk_size]
+			if out is None:
+				out = np.empty((len(index),) + values.shape[1:], dtype=values.dtype)
+			out[sel] = values
+		if out is None:
+			source = self.data[col]
+			out = np.empty((0,) + tuple(source.shape[1:]), dtype=source.dtype)
+		return out
+
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		# open files can't be pickled (or shared with forked processes), so they are reopened on demand
+		state.update(data=None, _loaded_data=False, _chunks={}, _columns=None)
+		del state['_chunks_lock']
+		return state
+
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self._chunks_lock = threading.Lock()
+
+
+
+class HDF5Table(ChunkedTable):
+	'''
+	lazily loaded table from an HDF5 file, where each (top-level) dataset is a column
+
+	by default the chunk size matches the chunking of the datasets (if they are chunked)
+	'''
+	def __init__(self, path: Union[str, Path], *, columns: Optional[list[str]] = None,
+				 chunk_size: Optional[int] = None, **kwargs):
+		super().__init__(chunk_size=chunk_size or 4096, **kwargs)
+		self.path = Path(path)
+		self._selected_columns = columns
+		self._auto_chunk_size = chunk_size is None
+		self._file = None
+
+
+	def _load_data(self) -> dict[str, Any]:
+		import h5py
+		self._file = h5py.File(self.path, 'r')
+		names = self._selected_columns
+		if names is None:
+			names = [name for name, item in self._file.items() if isinstance(item, h5py.Dataset)]
+		data = {name: self._file[name] for name in names}
+		if self._auto_chunk_size:
+			chunks = [dataset.chunks[0] for dataset in data.values() if dataset.chunks]
+			if chunks:
+				self.chunk_size = max(chunks)
+		return data
+
+
+	def close(self):
+		if self._file is not None:
+			self._file.close()
+			self._file = None
+			self.data = None
+			self._loaded_data = False
+			self.clear_chunks()
+
+
+	def __getstate__(self):
+		state = super().__getstate__()
+		state['_file'] = None
+		return state
+
+
+
+class NpyDirTable(ChunkedTable):
+	'''lazily loaded table from a directory of `.npy` files (one per column, see `ArrayTable.to_npy`)'''
+	def __init__(self, root: Union[str, Path], *, columns: Optional[list[str]] = None, **kwargs):
+		super().__init__(**kwargs)
+		self.root = Path(root)
+		self._selected_columns = columns
+
+
+	def _load_data(self) -> dict[str, Any]:
+		names = self._selected_columns
+		if names is None:
+			names = [path.stem for path in sorted(self.root.glob('*.npy'))]
+		import numpy as np
+		return {name: np.load(self.root / f'{name}.npy', mmap_mode='r') for name in names}
+
+
+
 # flags and conds
 from ..core import tool
 from ..core.tools import AutoToolCraft, ToolCraftBase, ToolSkill, ToolDecoratorBase
@@ -1,4 +1,6 @@
-from .datasets import Dataset, FrameSet
+from .datasets import Dataset, FrameSet, CachedDataset, ColumnCache
 from .batches import Batch, Frame
-from .planners import Indexed, BudgetExceeded, Unindexed, InfiniteIndexed
-from .trainers import TrainerBase
\ No newline at end of file
+from .planners import (Indexed, BudgetExceeded, Unindexed, InfiniteIndexed, BucketedIndexed,
+					   WeightedIndexed, StratifiedIndexed)
+from .trainers import TrainerBase
+from .prefetch import Prefetcher, SharedMemoryRing
\ No newline at end of file
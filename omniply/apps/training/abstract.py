@@ -148,3 +148,13 @@ class AbstractPlanner:
 		'''
 		raise NotImplementedError
 
+
+	def state_dict(self) -> Dict[str, Any]:
+		'''everything necessary to continue drawing exactly where the planner currently is (JSON serializable)'''
+		raise NotImplementedError
+
+
+	def load_state_dict(self, state: Dict[str, Any]) -> None:
+		'''continue from a state returned by `state_dict` (of a planner for the same dataset)'''
+		raise NotImplementedError
+
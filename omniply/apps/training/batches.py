@@ -1,4 +1,5 @@
 from .imports import *
+from collections import deque
 from .abstract import AbstractDataset, AbstractBatch, AbstractPlanner
 
 
@@ -25,6 +26,37 @@ class Batch(Context, AbstractBatch):
         self.include(info)
         
 
+    def reset(self, info: dict[str, Any]) -> Self:
+        '''
+        reuses this batch for the next info from the planner (much cheaper than creating a new batch)
+
+        The vendors are kept as they are (except any rolling stock), while the cache and the trace of the previous
+        info are dropped. If the new info has the same keys as the current one, it simply replaces the current values,
+        so the gadget table doesn't have to be updated at all.
+        '''
+        stock = [gadget for gadgets in self._rolling_stock.values() for gadget in gadgets.values()]
+        if stock:
+            self.exclude(*stock)
+        self.clear_cache()
+        self._history.clear()
+        self._products.clear()
+        self._rolling_stock.clear()
+        self._rolling_owners.clear()
+        self._inflight.clear()
+
+        current = self._info
+        if (isinstance(info, dict) and isinstance(current, BatchInfo) and not current._gauge
+                and info.keys() == current.data.keys()):
+            current.data = info
+            return self
+        if isinstance(info, dict):
+            info = self._BatchInfo(info)
+        self.exclude(current)
+        self._info = info
+        vendors = list(self.vendors())
+        return self.exclude(*vendors).extend([*vendors, info]) # the info has the lowest precedence (as in __init__)
+
+
     def gadgetry(self) -> Iterator[AbstractGadget]:
         for gadget in self.vendors():
             if gadget is not self._info:
@@ -41,6 +73,11 @@ class Batch(Context, AbstractBatch):
         return self._planner
 
 
+    def _stacked_size(self) -> Optional[int]:
+        # all samples of the batch are stacked (e.g. for vectorized tools)
+        return self.size
+
+
     def _new(self, size: int = None, *, planner=None, allow_draw=None, **kwargs) -> 'Batch':
         if planner is None:
             planner = self._planner
@@ -49,8 +86,7 @@ class Batch(Context, AbstractBatch):
         if size is None:
             size = self.size
         new = self.__class__(planner.draw(size), planner=planner, allow_draw=allow_draw, **kwargs)
-        new.extend(tuple(self.gadgetry()))
-        return new
+        return new._share_vendors(self, skip=[self._info])
 
 
     def new(self, size: int = None) -> 'Batch':
@@ -60,12 +96,31 @@ class Batch(Context, AbstractBatch):
 
 
 
+def recycle_batches(infos: Iterable[dict[str, Any]], create: Callable[[dict[str, Any]], Batch], *,
+                    pool: int = 1) -> Iterator[Batch]:
+    '''
+    creates a batch for each info using `create`, except that once `pool` batches exist, the oldest one is `reset`
+    with the next info instead (so only the last `pool` batches are valid at any time)
+    '''
+    assert pool > 0, 'pool must be positive'
+    batches = deque()
+    for info in infos:
+        batch = create(info) if len(batches) < pool else batches.popleft().reset(info)
+        batches.append(batch)
+        yield batch
+
+
+
 class Frame(Batch):
     @property
     def size(self) -> int:
         return 1
 
 
+    def _stacked_size(self) -> Optional[int]:
+        return None # frames contain a single (unstacked) sample
+
+
     def new(self):
         return super().new(1)
 
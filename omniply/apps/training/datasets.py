@@ -1,22 +1,232 @@
 from .imports import *
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from pathlib import Path
+from contextlib import closing
+from concurrent.futures import Executor
+from ...core.genetics import GeneticGadget
+from ..simple import gather_rows
 from .abstract import AbstractDataset, AbstractPlanner
-from .batches import Batch, Frame
+from .batches import Batch, Frame, recycle_batches
 from .planners import Indexed
+from .prefetch import Prefetcher
 
 
 
 class Dataset(ToolKit, AbstractDataset):
     _Planner = Indexed
     _Batch = Batch
-    def iterate(self, batch_size: Optional[int] = None) -> Iterator[Batch]:
+    _Prefetcher = Prefetcher
+    def iterate(self, batch_size: Optional[int] = None, *, prefetch: int = 0, workers: int = 1,
+                gizmos: Optional[Iterable[str]] = None, executor: Union[str, Executor] = 'thread',
+                shared_memory: Union[bool, int] = False, recycle: bool = False) -> Iterator[Batch]:
+        '''
+        :param prefetch: if positive, up to this many batches are prepared in the background (see `Prefetcher`)
+        :param gizmos: gizmos to grab ahead of time when prefetching (by default all gizmos of the dataset)
+        :param recycle: reuse a few batch objects (see `Batch.reset`) instead of creating a new batch for each
+        iteration, so a batch is only valid until the next one is requested (ignored with `shared_memory`)
+        '''
         if batch_size is None:
             batch_size = 1
         
         planner = self._Planner(self, max_epochs=1, shuffle=False, hard_budget=True, drop_last=False)
 
-        for info in planner.generate(batch_size):
-            batch = self._Batch(info, planner=planner, allow_draw=False)
-            yield batch.include(self)
+        create = lambda info: self._Batch(info, planner=planner, allow_draw=False).include(self)
+        if recycle and not (prefetch and shared_memory):
+            batches = recycle_batches(planner.generate(batch_size), create, pool=prefetch + 1)
+        else:
+            batches = (create(info) for info in planner.generate(batch_size))
+        if prefetch:
+            batches = iter(self._Prefetcher(batches, self.gizmos() if gizmos is None else gizmos,
+                                            prefetch=prefetch, workers=workers, executor=executor,
+                                            shared_memory=shared_memory))
+        with closing(batches):
+            yield from batches
+
+
+
+class ColumnCache(GeneticGadget):
+    '''
+    Records the values of some gizmos of a dataset (column-wise, with a row for every `index`) as they are computed,
+    and serves them from the recorded columns from then on, so e.g. decoding and preprocessing only runs during the
+    first epoch. This is only correct for gizmos which are deterministic functions of the index (e.g. not for random
+    augmentations).
+
+    Only numeric (and other fixed-size) arrays are recorded, gizmos with other values (or inconsistent shapes or
+    dtypes) are simply always computed. Columns are kept in memory until `memory_budget` is used up, the remaining
+    columns are memory-mapped files in `spill_dir` (by default a temporary directory, which is removed with the cache).
+
+    Note that (as with `ArrayTable`) contiguous indices are served as views of the columns, so don't modify them in
+    place. Only the cache in this process records values (copies sent to worker processes just compute them).
+    '''
+    def __init__(self, source: AbstractGadget, gizmos: Iterable[str], size: int, *, index_key: str = 'index',
+                 memory_budget: Optional[int] = 2**30, spill_dir: Union[str, Path, None] = None, **kwargs):
+        '''
+        :param source: computes the values which are not recorded yet (e.g. the underlying dataset)
+        :param gizmos: the gizmos to record
+        :param size: number of rows (i.e. the size of the dataset)
+        :param memory_budget: maximum number of bytes of all columns kept in memory (None for no limit)
+        :param spill_dir: directory for columns which don't fit in the memory budget
+        '''
+        super().__init__(**kwargs)
+        self._source = source
+        self._gizmos = tuple(gizmos)
+        self._size = size
+        self._index_key = index_key
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self._columns = {} # gizmo -> (column, mask of the recorded rows or None once all rows are recorded)
+        self._remaining = {} # gizmo -> number of rows which are not recorded yet
+        self._skipped = set() # gizmos whose values can't be recorded
+        self._spilled = [] # paths of the memory-mapped columns
+        self._cleanup = None
+        self._lock = threading.Lock()
+        self._recording = True
+        self.memory_used = 0
+        self.hits = 0
+        self.misses = 0
+
+
+    def __getstate__(self):
+        state = super().__getstate__() if hasattr(super(), '__getstate__') else self.__dict__
+        state = state.copy()
+        # copies (e.g. in worker processes) neither send the columns nor write to the spilled files
+        state.update(_columns={}, _remaining={}, _spilled=[], _cleanup=None, _lock=None, _recording=False)
+        return state
+
+
+    def gizmos(self) -> Iterator[str]:
+        yield from self._gizmos
+
+
+    def _genetic_information(self, gizmo: str):
+        info = super()._genetic_information(gizmo)
+        info['parents'] = [self._index_key]
+        return info
+
+
+    @property
+    def complete(self) -> bool:
+        '''whether all gizmos are recorded for every index (or can't be recorded at all)'''
+        return all(gizmo in self._skipped or self._columns.get(gizmo, (None, False))[1] is None
+                   for gizmo in self._gizmos)
+
+
+    def grab_from(self, ctx: 'AbstractGame', gizmo: str) -> Any:
+        index = ctx.grab(self._index_key)
+        column, filled = self._columns.get(gizmo, (None, False))
+        if column is not None and (filled is None or filled[index].all()):
+            self.hits += 1
+            return gather_rows(column, index)
+        self.misses += 1
+        value = self._source.grab_from(ctx, gizmo)
+        if self._recording and gizmo not in self._skipped:
+            self._record(gizmo, index, value)
+        return value
+
+
+    def _allocate(self, shape: tuple[int, ...], dtype: Any):
+        import numpy as np
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        if self.memory_budget is None or self.memory_used + nbytes <= self.memory_budget:
+            self.memory_used += nbytes
+            return np.empty(shape, dtype=dtype)
+        root = self.spill_dir
+        if root is None:
+            root = self.spill_dir = tempfile.mkdtemp(prefix='omniply-cache-')
+            self._cleanup = weakref.finalize(self, shutil.rmtree, root, ignore_errors=True)
+        Path(root).mkdir(parents=True, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix='.npy', prefix='column-', dir=root) # (unique even if the directory is shared)
+        os.close(fd)
+        self._spilled.append(path)
+        return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+
+
+    def _record(self, gizmo: str, index: Any, value: Any) -> None:
+        import numpy as np
+        if not isinstance(value, (np.ndarray, np.generic, int, float, bool, complex)):
+            self._skipped.add(gizmo)
+            return
+        index = np.asarray(index)
+        value = np.asarray(value)
+        if index.ndim > 1 or (index.ndim == 1 and (value.ndim == 0 or len(value) != len(index))):
+            return # not a batch of samples (so nothing can be recorded this time)
+        shape = value.shape[index.ndim:]
+        with self._lock:
+            column, filled = self._columns.get(gizmo, (None, False))
+            if gizmo in self._skipped or filled is None:
+                return
+            if column is None:
+                if value.dtype.hasobject:
+                    self._skipped.add(gizmo)
+                    return
+                column = self._allocate((self._size, *shape), value.dtype)
+                filled = np.zeros(self._size, dtype=bool)
+                self._remaining[gizmo] = self._size
+            elif column.shape[1:] != shape or not np.can_cast(value.dtype, column.dtype):
+                self._skipped.add(gizmo) # inconsistent values (the column is dropped)
+                del self._columns[gizmo], self._remaining[gizmo]
+                return
+            new = np.unique(index[~filled[index]]) if index.ndim else ([] if filled[index] else [index])
+            column[index] = value
+            filled[index] = True
+            self._remaining[gizmo] -= len(new)
+            self._columns[gizmo] = column, (filled if self._remaining[gizmo] else None)
+
+
+    def clear(self) -> None:
+        '''drops all recorded values (and removes the spilled files)'''
+        with self._lock:
+            self._columns.clear()
+            self._remaining.clear()
+            self._skipped.clear()
+            self.memory_used = 0
+            for path in self._spilled:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass # (e.g. still mapped on windows)
+            self._spilled.clear()
+
+
+
+class CachedDataset(Dataset):
+    '''
+    Wraps a dataset so that the given gizmos are recorded during the first epoch and served from memory (or
+    memory-mapped files) afterwards (see `ColumnCache`), while all other gizmos come from the dataset as usual.
+    '''
+    _ColumnCache = ColumnCache
+
+    def __init__(self, source: Dataset, gizmos: Iterable[str], *, index_key: str = 'index',
+                 memory_budget: Optional[int] = 2**30, spill_dir: Union[str, Path, None] = None, **kwargs):
+        '''
+        :param source: the dataset to cache
+        :param gizmos: the (deterministic) gizmos to record
+        :param memory_budget: maximum number of bytes of recorded values kept in memory (None for no limit)
+        :param spill_dir: directory for recorded values exceeding the memory budget (by default a temporary directory)
+        '''
+        gizmos = tuple(gizmos)
+        missing = set(gizmos).difference(source.gizmos())
+        if missing:
+            raise ValueError(f'{source!r} cannot produce: {", ".join(sorted(missing))}')
+        super().__init__(**kwargs)
+        self._source = source
+        self.cache = self._ColumnCache(source, gizmos, source.size, index_key=index_key,
+                                       memory_budget=memory_budget, spill_dir=spill_dir)
+        self.extend([self.cache, source])
+
+
+    @property
+    def source(self) -> Dataset:
+        return self._source
+
+
+    @property
+    def size(self) -> int:
+        return self._source.size
 
 
 
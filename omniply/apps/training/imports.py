@@ -1,4 +1,4 @@
-from typing import Any, Iterable, Iterator, Type, Optional, Union, Self, Dict, List, Mapping
+from typing import Any, Iterable, Iterator, Type, Optional, Union, Self, Dict, List, Mapping, Callable
 from ...core.gaggles import AbstractGaggle, AbstractGame, AbstractGadget, LoopyGaggle, MutableGaggle
 # from ...core import Scope
 from ...gears.mechanics import AbstractMechanics
@@ -1,5 +1,7 @@
 from .imports import *
 from .abstract import AbstractDataset, AbstractBatch, AbstractPlanner
+from concurrent.futures import ThreadPoolExecutor
+import threading
 
 
 
@@ -15,7 +17,20 @@ class InfiniteUnindexed(AbstractPlanner):
 	def step(self, size: int) -> Dict[str, Any]:
 		info = super().step(size)
 		self._num_iterations += 1
+		info['planner_state'] = self.state_dict() # to resume right after this batch (e.g. after a crash)
 		return info
+
+
+	def state_dict(self) -> Dict[str, Any]:
+		return {'num_iterations': self._num_iterations,
+				'drawn_samples': self._drawn_samples,
+				'drawn_batches': self._drawn_batches}
+
+
+	def load_state_dict(self, state: Dict[str, Any]) -> None:
+		self._num_iterations = state['num_iterations']
+		self._drawn_samples = state['drawn_samples']
+		self._drawn_batches = state['drawn_batches']
 		
 
 	def draw(self, n: int) -> Dict[str, Any]:
@@ -38,12 +53,31 @@ class InfiniteUnindexed(AbstractPlanner):
 
 
 class InfiniteIndexed(InfiniteUnindexed):
+	_precompute_executor = None # single worker shared by all planners (created on first use)
+	_precompute_lock = threading.Lock()
+
 	def __init__(self, src: AbstractDataset, *, shuffle: bool = True,
 			  	 multi_epoch: bool = True, seed: int = None, sort_indices: bool = True,
+				 precompute: bool = False, shard: int = 0, num_shards: int = 1, drop_uneven: bool = False,
 				 **kwargs):
+		'''
+		:param precompute: if True, the order of the next epoch is computed in the background (useful for large
+		shuffled datasets)
+		:param shard: which part of each epoch to draw from (e.g. the rank of the worker)
+		:param num_shards: number of disjoint parts each epoch is split into (e.g. the world size), all shards must use
+		the same seed
+		:param drop_uneven: if True, the last samples of the epoch are dropped so all shards have the same size,
+		otherwise the shards are padded with the first samples of the epoch
+		'''
+		assert 0 <= shard < num_shards, f'shard must be in [0, {num_shards}), not {shard}'
 		if seed is None:
+			assert num_shards == 1, 'all shards must use the same seed'
 			seed = random.randint(1, 2**32-1)
 		super().__init__(src=src, **kwargs)
+		self._shard = shard
+		self._num_shards = num_shards
+		self._drop_uneven = drop_uneven
+		assert self._epoch_size != 0, f'too many shards ({num_shards}) for {self._full_epoch_size} samples'
 		self._shuffle = shuffle
 		self._multi_epoch = multi_epoch
 		self._sort_indices = sort_indices
@@ -52,6 +86,59 @@ class InfiniteIndexed(InfiniteUnindexed):
 		self._order = None
 		self._offset = 0
 		self._drawn_epochs = 0
+		self._precompute = precompute
+		self._upcoming = None # (seed, future) of the order of the next epoch
+
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state['_upcoming'] = None # (just recomputed if necessary)
+		return state
+
+
+	@property
+	def _full_epoch_size(self) -> Optional[int]:
+		'''number of samples in an epoch (of all shards together)'''
+		return self._dataset_size
+
+
+	@property
+	def _epoch_size(self) -> Optional[int]:
+		'''number of samples in an epoch (of this shard)'''
+		size = self._full_epoch_size
+		if size is None or self._num_shards == 1:
+			return size
+		if self._drop_uneven:
+			return size // self._num_shards
+		return -(-size // self._num_shards)
+
+
+	def state_dict(self) -> Dict[str, Any]:
+		state = super().state_dict()
+		state.update({'dataset_size': self._dataset_size,
+					  'shard': self._shard,
+					  'num_shards': self._num_shards,
+					  'initial_seed': self._initial_seed,
+					  'seed': self._seed,
+					  'offset': int(self._offset),
+					  'drawn_epochs': self._drawn_epochs,
+					  'in_epoch': self._order is not None})
+		return state
+
+
+	def load_state_dict(self, state: Dict[str, Any]) -> None:
+		assert state['dataset_size'] == self._dataset_size, \
+			f'planner state is for a dataset of size {state["dataset_size"]}, not {self._dataset_size}'
+		assert (state['shard'], state['num_shards']) == (self._shard, self._num_shards), \
+			f'planner state is for shard {state["shard"]} of {state["num_shards"]}'
+		super().load_state_dict(state)
+		self._initial_seed = state['initial_seed']
+		self._seed = state['seed']
+		self._offset = state['offset']
+		self._drawn_epochs = state['drawn_epochs']
+		self._upcoming = None
+		# the order of the current epoch is recomputed from its seed (rather than replaying the drawn batches)
+		self._order = self._epoch_order(self._seed) if state['in_epoch'] else None
 
 
 	@staticmethod
@@ -60,31 +147,77 @@ class InfiniteIndexed(InfiniteUnindexed):
 		return random.Random(seed).randint(1, 2**32-1)
 
 
-	def _draw_indices(self, n: int):
+	def _epoch_samples(self, seed: int):
+		'''samples of an epoch in order (of all shards together)'''
+		import numpy as np
+		if self._shuffle:
+			return np.random.RandomState(seed).permutation(self._dataset_size)
+		return np.arange(self._dataset_size)
+
+
+	def _epoch_order(self, seed: int):
+		'''order of the samples in an epoch (never modified once created)'''
 		import numpy as np
+		order = self._epoch_samples(seed)
+		if self._num_shards > 1:
+			# every shard takes every num_shards-th sample of the same order (padded cyclically or truncated)
+			order = np.resize(order, self._epoch_size * self._num_shards)[self._shard::self._num_shards].copy()
+		return order
+
 
+	@staticmethod
+	def _background() -> ThreadPoolExecutor:
+		'''executor computing the orders of upcoming epochs (separate from any other thread pools)'''
+		with InfiniteIndexed._precompute_lock:
+			if InfiniteIndexed._precompute_executor is None:
+				InfiniteIndexed._precompute_executor = ThreadPoolExecutor(1, thread_name_prefix='omniply-planner')
+			return InfiniteIndexed._precompute_executor
+
+
+	def _start_epoch(self) -> None:
+		if self._drawn_epochs > 0:
+			self._seed = self._increment_seed(self._seed)
+		upcoming, self._upcoming = self._upcoming, None
+		if upcoming is not None and upcoming[0] == self._seed:
+			self._order = upcoming[1].result()
+		else:
+			self._order = self._epoch_order(self._seed)
+		self._offset = 0
+		self._drawn_epochs += 1
+		if self._precompute:
+			seed = self._increment_seed(self._seed)
+			self._upcoming = seed, self._background().submit(self._epoch_order, seed)
+
+
+	def _draw_indices(self, n: int):
 		if self._dataset_size is None:
 			return None
 
 		if self._order is None:
-			if self._drawn_samples > 0:
-				self._seed = self._increment_seed(self._seed)
-			self._order = np.random.RandomState(self._seed).permutation(self._dataset_size) if self._shuffle else np.arange(self._dataset_size)
-			self._offset = 0
-			self._drawn_epochs += 1
+			self._start_epoch()
 
-		assert self._multi_epoch or n < len(self._order), f'batch size is too large: max is {len(self._order)}'
+		order, offset = self._order, self._offset
+		assert self._multi_epoch or n < len(order), f'batch size is too large: max is {len(order)}'
 
-		if self._offset + n > len(self._order): # need to wrap around
-			indices = self._order[self._offset:]
+		if offset + n <= len(order):
+			self._offset = offset + n
+			indices = order[offset:offset + n].copy() # (the order itself is never modified)
+		elif not self._multi_epoch: # partial batch with the rest of the epoch
 			self._order = None
-			if self._multi_epoch:
-				indices = np.concatenate((indices, self._draw_indices(n - len(indices))))
-		else:
-			indices = self._order[self._offset:self._offset + n]
-			self._offset += n
-		
-		if self._sort_indices:
+			indices = order[offset:].copy()
+		else: # wrap around (possibly several times), filling the batch in place
+			import numpy as np
+			indices = np.empty(n, dtype=order.dtype)
+			filled = len(order) - offset
+			indices[:filled] = order[offset:]
+			while filled < n:
+				self._start_epoch()
+				step = min(n - filled, len(self._order))
+				indices[filled:filled + step] = self._order[:step]
+				self._offset = step
+				filled += step
+
+		if self._sort_indices and n > 1:
 			indices.sort()
 		return indices
 
@@ -191,15 +324,16 @@ class Indexed(Unindexed, InfiniteIndexed):
 	def draw(self, n: int):
 		if self._max_epochs is not None and self._drawn_epochs >= self._max_epochs:
 			assert self._dataset_size is not None, 'dataset size must be provided to draw the last batch'
-			if self._drawn_epochs > self._max_epochs or self._offset == self._dataset_size:
+			epoch_size = self._epoch_size
+			if self._drawn_epochs > self._max_epochs or self._offset == epoch_size:
 				raise self._BudgetExceeded(f'max epochs exceeded: {self._max_epochs}')
-			elif self._offset + n > self._dataset_size:
+			elif self._offset + n > epoch_size:
 				if self._hard_budget and self._drop_last:
 					raise self._BudgetExceeded(f'max epochs exceeded: {self._max_samples}')
 				elif not self._hard_budget:
 					pass # allow the draw to happen and raise in the next draw
 				elif not self._drop_last:
-					n = self._dataset_size - self._offset
+					n = epoch_size - self._offset
 		idx = super().draw(n)
 		return idx
 	
@@ -207,8 +341,270 @@ class Indexed(Unindexed, InfiniteIndexed):
 	def expected_iterations(self, step_size: int) -> Optional[int]:
 		num = super().expected_iterations(step_size)
 		if num is None and self._max_epochs is not None and self._dataset_size is not None:
-			remaining = self._max_epochs * self._dataset_size - self._drawn_samples
+			remaining = self._max_epochs * self._epoch_size - self._drawn_samples
 			return (remaining // step_size) + (1 if (remaining % step_size > 0 and not (self._hard_budget and self._drop_last)) else 0)
 		return num
 		
 
+
+
+def _read_column(src: AbstractDataset, gizmo: str):
+	'''grabs a gizmo for all samples of the dataset at once (e.g. a column of a table)'''
+	import numpy as np
+	ctx = Context(src)
+	ctx['index'] = np.arange(src.size)
+	return ctx.grab(gizmo)
+
+
+
+class BucketedIndexed(Indexed):
+	'''
+	Draws batches of samples with similar sizes (e.g. sequence lengths or point counts) to minimize padding.
+
+	The size of every sample is read once (the gizmo `size_key` of the whole dataset, unless `sizes` are given), and
+	the samples are split into `num_buckets` buckets of about the same number of samples by size. Every epoch, the
+	samples of each bucket are shuffled and split into batches, either of the requested batch size, or as many samples
+	as fit into `max_elements` (the number of samples times the largest size in the bucket). All batches of the epoch
+	are then drawn in random order, so each batch only contains samples of a single bucket (the last batch of each
+	bucket may be smaller). The epoch budgets (`max_epochs`, etc.) work as usual, and batches never span epochs.
+	'''
+	def __init__(self, src: AbstractDataset, *, size_key: str = 'size', sizes: Optional[Iterable[int]] = None,
+				 num_buckets: int = 10, max_elements: Optional[int] = None, **kwargs):
+		'''
+		:param size_key: gizmo of the size of each sample (grabbed with the indices of all samples at once)
+		:param sizes: size of each sample (instead of reading them from the dataset)
+		:param num_buckets: number of buckets to split the samples into (more buckets means less padding but less
+		random batches)
+		:param max_elements: if given, batches are filled up to this many elements (instead of the batch size)
+		'''
+		import numpy as np
+		kwargs.setdefault('precompute', False) # (the plan of the next epoch depends on the batch size)
+		super().__init__(src=src, **kwargs)
+		assert self._dataset_size is not None, 'bucketing requires a dataset with a known size'
+		sizes = np.asarray(_read_column(src, size_key) if sizes is None else sizes)
+		assert sizes.shape == (self._dataset_size,), f'expected {self._dataset_size} sizes, got {sizes.shape}'
+		ranks = np.empty(len(sizes), dtype=np.int64)
+		ranks[np.argsort(sizes, kind='stable')] = np.arange(len(sizes))
+		self._num_buckets = num_buckets
+		self._buckets = ranks * num_buckets // len(sizes)
+		self._bucket_sizes = np.zeros(num_buckets, dtype=sizes.dtype)
+		np.maximum.at(self._bucket_sizes, self._buckets, sizes)
+		self._max_elements = max_elements
+		self._plan_size = None
+		self._bounds = None # end of each batch in the order of the current epoch
+
+
+	def _batch_lengths(self, counts, plan_size: Optional[int] = None):
+		'''lengths of all batches of an epoch (grouped by bucket) given the number of samples in each bucket'''
+		import numpy as np
+		plan_size = self._plan_size if plan_size is None else plan_size
+		lengths = []
+		for bucket, count in enumerate(counts):
+			if self._max_elements is None:
+				length = plan_size
+			else:
+				length = max(1, int(self._max_elements // max(1, self._bucket_sizes[bucket])))
+			full, rest = divmod(int(count), length)
+			lengths.extend([length] * full + ([rest] if rest else []))
+		return np.array(lengths, dtype=np.int64)
+
+
+	def _batch_permutation(self, num: int, seed: int):
+		import numpy as np
+		if self._shuffle:
+			return np.random.RandomState([seed, 1]).permutation(num)
+		return np.arange(num)
+
+
+	def _epoch_order(self, seed: int):
+		import numpy as np
+		order = super()._epoch_order(seed) # (shuffled samples of this shard)
+		order = order[np.argsort(self._buckets[order], kind='stable')]
+		lengths = self._batch_lengths(np.bincount(self._buckets[order], minlength=self._num_buckets))
+		perm = self._batch_permutation(len(lengths), seed)
+		starts = np.cumsum(lengths) - lengths
+		moved = lengths[perm]
+		# move the batches into random order
+		return order[np.arange(len(order)) + np.repeat(starts[perm] - (np.cumsum(moved) - moved), moved)]
+
+
+	def _start_epoch(self) -> None:
+		super()._start_epoch()
+		self._bounds = None
+
+
+	def draw(self, n: int) -> Dict[str, Any]:
+		import numpy as np
+		if self._order is None or self._offset >= len(self._order):
+			if self._max_elements is None or self._plan_size is None:
+				self._plan_size = n
+			self._start_epoch()
+		bounds = self._current_bounds()
+		end = bounds[np.searchsorted(bounds, self._offset, side='right')]
+		return super().draw(int(end) - self._offset) # the budgets are checked for the actual batch size
+
+
+	def _current_bounds(self):
+		'''end of each batch in the current epoch'''
+		import numpy as np
+		if self._bounds is None:
+			lengths = self._batch_lengths(np.bincount(self._buckets[self._order], minlength=self._num_buckets))
+			self._bounds = np.cumsum(lengths[self._batch_permutation(len(lengths), self._seed)])
+		return self._bounds
+
+
+	def expected_iterations(self, step_size: int) -> Optional[int]:
+		import numpy as np
+		num = super(Indexed, self).expected_iterations(step_size)
+		if num is not None or self._max_epochs is None:
+			return num
+		if self._order is None:
+			counts = np.bincount(self._buckets[InfiniteIndexed._epoch_order(self, self._seed)],
+								 minlength=self._num_buckets)
+			return len(self._batch_lengths(counts, step_size)) * (self._max_epochs - self._drawn_epochs)
+		bounds = self._current_bounds()
+		current = len(bounds) - int(np.searchsorted(bounds, self._offset, side='right')) # left in this epoch
+		counts = np.bincount(self._buckets[self._order], minlength=self._num_buckets)
+		return current + len(self._batch_lengths(counts, step_size)) * max(0, self._max_epochs - self._drawn_epochs)
+
+
+	def state_dict(self) -> Dict[str, Any]:
+		state = super().state_dict()
+		state['plan_size'] = self._plan_size
+		return state
+
+
+	def load_state_dict(self, state: Dict[str, Any]) -> None:
+		self._plan_size = state['plan_size'] # (the order of the epoch depends on it)
+		super().load_state_dict(state)
+		self._bounds = None
+
+
+
+def alias_table(weights) -> tuple:
+	'''
+	Builds a Walker alias table to draw samples proportional to the weights in O(1) each (see `draw_alias`).
+
+	The table is built in vectorized rounds: all samples with less than the average weight are paired with the
+	samples above the average (in order of their cumulative deficit and excess), and samples which drop below the
+	average in the process are paired in the next round.
+
+	:return: the acceptance probability and the alias of each sample
+	'''
+	import numpy as np
+	weights = np.asarray(weights, dtype=np.float64)
+	assert weights.ndim == 1 and len(weights), 'weights must be a non-empty vector'
+	assert (weights >= 0).all() and weights.sum() > 0, 'weights must be non-negative and not all zero'
+	prob = weights * (len(weights) / weights.sum())
+	alias = np.arange(len(weights))
+	small, large = np.flatnonzero(prob < 1), np.flatnonzero(prob >= 1)
+	while len(small) and len(large):
+		deficit = 1 - prob[small]
+		owner = np.searchsorted(np.cumsum(prob[large] - 1), np.cumsum(deficit) - deficit, side='right')
+		paired = owner < len(large) # (only rounding errors are left otherwise)
+		if not paired.any():
+			break
+		alias[small[paired]] = large[owner[paired]]
+		prob[large] -= np.bincount(owner[paired], weights=deficit[paired], minlength=len(large))
+		drained = prob[large] < 1
+		small, large = np.concatenate([small[~paired], large[drained]]), large[~drained]
+	prob[small] = 1
+	prob[large] = 1
+	return prob, alias
+
+
+def draw_alias(rng, prob, alias, n: int):
+	'''draws n samples (with replacement) from an alias table (see `alias_table`) using a numpy RandomState'''
+	import numpy as np
+	picks = rng.randint(0, len(prob), size=n)
+	return np.where(rng.random_sample(n) < prob[picks], picks, alias[picks])
+
+
+
+class WeightedIndexed(Indexed):
+	'''
+	Draws samples with replacement proportional to a weight per sample (e.g. importance sampling).
+
+	The weights are read once (the gizmo `weight_key` of the whole dataset, unless `weights` are given) into an alias
+	table, so each sample is drawn in O(1). An epoch is `epoch_samples` draws (by default the size of the dataset),
+	which are generated from the seed of the epoch all at once, so the epoch budgets, sharding, and the planner state
+	work as usual.
+	'''
+	def __init__(self, src: AbstractDataset, *, weight_key: str = 'weight', weights: Optional[Iterable[float]] = None,
+				 epoch_samples: Optional[int] = None, **kwargs):
+		'''
+		:param weight_key: gizmo of the weight of each sample (grabbed with the indices of all samples at once)
+		:param weights: weight of each sample (instead of reading them from the dataset)
+		:param epoch_samples: number of samples in an epoch
+		'''
+		self._epoch_samples_size = src.size if epoch_samples is None else epoch_samples
+		super().__init__(src=src, **kwargs)
+		assert self._dataset_size is not None, 'weighted sampling requires a dataset with a known size'
+		weights = _read_column(src, weight_key) if weights is None else weights
+		assert len(weights) == self._dataset_size, f'expected {self._dataset_size} weights, got {len(weights)}'
+		self._prob, self._alias = alias_table(weights)
+
+
+	@property
+	def _full_epoch_size(self) -> Optional[int]:
+		return self._epoch_samples_size
+
+
+	def _epoch_samples(self, seed: int):
+		import numpy as np
+		return draw_alias(np.random.RandomState(seed), self._prob, self._alias, self._epoch_samples_size)
+
+
+
+class StratifiedIndexed(Indexed):
+	'''
+	Draws class-balanced batches, i.e. every stratum (e.g. class) is drawn equally often, regardless of its size.
+
+	The strata are read once (the gizmo `stratum_key` of the whole dataset, unless `strata` are given). In each
+	epoch, every stratum contributes the same number of samples (cycling through shuffled copies of the stratum if
+	it is too small), drawn in rounds: every round of `k` consecutive samples (for `k` strata, counted from the
+	start of the epoch) contains each stratum exactly once, in random order. So batches aligned to the rounds (e.g.
+	when the batch size and the epoch size are multiples of `k`, without sharding) contain every stratum equally
+	often, while batches spanning two rounds are only roughly balanced (e.g. with `k = 3`, a batch of 2 samples may
+	contain the same stratum twice). An epoch is `epoch_samples` samples (by default the size of the dataset).
+	'''
+	def __init__(self, src: AbstractDataset, *, stratum_key: str = 'label', strata: Optional[Iterable] = None,
+				 epoch_samples: Optional[int] = None, **kwargs):
+		'''
+		:param stratum_key: gizmo of the stratum of each sample (grabbed with the indices of all samples at once)
+		:param strata: stratum of each sample (instead of reading them from the dataset)
+		:param epoch_samples: number of samples in an epoch
+		'''
+		import numpy as np
+		self._epoch_samples_size = src.size if epoch_samples is None else epoch_samples
+		super().__init__(src=src, **kwargs)
+		assert self._dataset_size is not None, 'stratified sampling requires a dataset with a known size'
+		strata = np.asarray(_read_column(src, stratum_key) if strata is None else strata)
+		assert strata.shape == (self._dataset_size,), f'expected {self._dataset_size} strata, got {strata.shape}'
+		self._strata, codes = np.unique(strata, return_inverse=True)
+		order = np.argsort(codes, kind='stable')
+		self._members = np.split(order, np.cumsum(np.bincount(codes))[:-1]) # samples of each stratum
+
+
+	@property
+	def _full_epoch_size(self) -> Optional[int]:
+		return self._epoch_samples_size
+
+
+	def _epoch_samples(self, seed: int):
+		import numpy as np
+		rng = np.random.RandomState(seed)
+		k = len(self._members)
+		rounds = -(-self._epoch_samples_size // k)
+		columns = []
+		for members in self._members:
+			copies = -(-rounds // len(members))
+			if self._shuffle:
+				picks = members[np.argsort(rng.random_sample((copies, len(members))), axis=1)].reshape(-1)
+			else:
+				picks = np.tile(members, copies)
+			columns.append(picks[:rounds])
+		table = np.stack(columns, axis=1) # one sample of each stratum per round
+		if self._shuffle:
+			table = np.take_along_axis(table, np.argsort(rng.random_sample(table.shape), axis=1), axis=1)
+		return table.reshape(-1)[:self._epoch_samples_size]
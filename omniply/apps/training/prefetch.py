@@ -0,0 +1,261 @@
+from .imports import *
+import sys
+import gc
+import threading
+import weakref
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+from ...core.abstract import AbstractGadgetError
+from .abstract import AbstractBatch
+from .planners import BudgetExceeded
+
+
+
+def _prepare(batch: AbstractBatch, gizmos: Iterable[str]) -> AbstractBatch:
+	'''grabs the gizmos in place (failures are ignored here, they are raised again when the gizmo is grabbed later)'''
+	for gizmo in gizmos:
+		try:
+			batch.grab(gizmo)
+		except AbstractGadgetError:
+			pass
+	return batch
+
+
+def _prepare_remote(batch: AbstractBatch, gizmos: Iterable[str]) -> Dict[str, Any]:
+	'''grabs the gizmos from a copy of the batch (e.g. in a worker process) and returns their values'''
+	values = {}
+	for gizmo in gizmos:
+		try:
+			values[gizmo] = batch.grab(gizmo)
+		except AbstractGadgetError:
+			pass
+	return values
+
+
+
+_attached_buffers = {} # name -> shared memory block (in worker processes)
+def _attach(name: str) -> shared_memory.SharedMemory:
+	block = _attached_buffers.get(name)
+	if block is None:
+		try:
+			block = shared_memory.SharedMemory(name=name, track=False) # the owner takes care of unlinking
+		except TypeError: # (before python 3.13)
+			block = shared_memory.SharedMemory(name=name)
+		_attached_buffers[name] = block
+	return block
+
+
+def _prepare_shared(batch: AbstractBatch, gizmos: Iterable[str],
+					slot: Optional[tuple[str, int]]) -> tuple[Dict[str, Any], Dict[str, tuple]]:
+	'''
+	like `_prepare_remote`, except arrays are written into the shared memory block `slot` (as long as they fit)
+
+	:return: the remaining values and the location (offset, shape, dtype) of the arrays in the block
+	'''
+	values = _prepare_remote(batch, gizmos)
+	placed = {}
+	np = sys.modules.get('numpy')
+	if slot is None or np is None:
+		return values, placed
+	name, capacity = slot
+	buf = _attach(name).buf
+	offset = 0
+	for gizmo, value in list(values.items()):
+		if (isinstance(value, np.ndarray) and not value.dtype.hasobject and value.nbytes > 0
+				and offset + value.nbytes <= capacity):
+			np.ndarray(value.shape, value.dtype, buffer=buf, offset=offset)[...] = value
+			placed[gizmo] = offset, value.shape, value.dtype
+			offset += -(-value.nbytes // SharedMemoryRing.alignment) * SharedMemoryRing.alignment
+			del values[gizmo]
+	return values, placed
+
+
+
+class SharedMemoryRing:
+	'''
+	Recycled set of shared memory blocks for sending arrays from worker processes without pickling them.
+
+	Each batch in flight uses one block (slot): the worker writes all its arrays into the block, and the arrays in
+	the batch are views of the block (no copy). The slot is released once the batch is garbage collected, so it can
+	be reused for a later batch. If no slot is free, or an array doesn't fit, it is pickled as usual.
+
+	Note that arrays taken out of a batch (and kept after the batch is dropped) may be overwritten by later batches,
+	so copy them if necessary.
+	'''
+	alignment = 64
+
+	def __init__(self, slots: int, slot_bytes: int = 2**26):
+		'''
+		:param slots: number of blocks (should exceed the number of batches in flight and kept by the consumer)
+		:param slot_bytes: size of each block (the arrays of a single batch must fit, and all blocks together must fit
+		in the shared memory of the system, e.g. `/dev/shm`)
+		'''
+		assert slots > 0 and slot_bytes > 0, 'slots and slot_bytes must be positive'
+		self.slot_bytes = slot_bytes
+		self._blocks = [shared_memory.SharedMemory(create=True, size=slot_bytes) for _ in range(slots)]
+		self._free = list(range(slots))
+		self._lock = threading.Lock()
+		self.fallbacks = 0 # number of batches sent without shared memory (because all slots were in use)
+
+
+	def acquire(self) -> Optional[int]:
+		'''returns a free slot (or None if all are in use)'''
+		with self._lock:
+			if self._free:
+				return self._free.pop()
+		gc.collect() # batches contain reference cycles, so dropped batches may not have been collected yet
+		with self._lock:
+			if self._free:
+				return self._free.pop()
+			self.fallbacks += 1
+
+
+	def release(self, slot: int) -> None:
+		with self._lock:
+			self._free.append(slot)
+
+
+	def location(self, slot: int) -> tuple[str, int]:
+		'''name and capacity of the slot (to be sent to the worker)'''
+		return self._blocks[slot].name, self.slot_bytes
+
+
+	def receive(self, batch: AbstractBatch, slot: int, placed: Dict[str, tuple]) -> None:
+		'''inserts views of the arrays in the slot into the batch, and releases the slot once the batch is dropped'''
+		import numpy as np
+		buf = self._blocks[slot].buf
+		for gizmo, (offset, shape, dtype) in placed.items():
+			if gizmo not in batch.data:
+				batch[gizmo] = np.ndarray(shape, dtype, buffer=buf, offset=offset)
+		weakref.finalize(batch, self.release, slot)
+
+
+	def close(self) -> None:
+		'''unlinks all blocks (arrays that are still in use remain valid)'''
+		for block in self._blocks:
+			try:
+				block.close()
+			except BufferError:
+				pass # still in use, so the block is unmapped once the last array is gone
+			block.unlink()
+		self._blocks.clear()
+		self._free.clear()
+
+
+
+class Prefetcher:
+	'''
+	Prepares batches ahead of time by grabbing a list of gizmos in the background (e.g. loading and augmentation),
+	so the data side overlaps with whatever the consumer does with the previous batch (e.g. the optimization step).
+
+	The batches are drawn from `batches` in order by the consuming thread (so planners don't have to be thread-safe),
+	and yielded in exactly the same order, regardless of which worker finishes first. At most `prefetch` batches are
+	in flight at any time. When `batches` is exhausted (or the planner raises `BudgetExceeded`), the remaining batches
+	are yielded, and if the consumer stops early, all pending work is cancelled (or waited for) and the workers are
+	shut down.
+
+	With threads (default) the gizmos are grabbed directly in each batch. With processes the batch is pickled, the
+	gizmos are grabbed in the worker, and only the values are sent back and cached in the batch, so all gadgets (and
+	the values) must be picklable. To avoid pickling large arrays, `shared_memory` sends them through a
+	`SharedMemoryRing` instead (the cached arrays are views of shared memory, see `SharedMemoryRing` for caveats).
+
+	Note that the planner draws up to `prefetch` batches ahead of the consumer, and that `batch.new()` must not be
+	used while the batch is being prepared.
+	'''
+	def __init__(self, batches: Iterable[AbstractBatch], gizmos: Iterable[str], *, prefetch: int = 2,
+				 workers: int = 1, executor: Union[str, Executor] = 'thread',
+				 shared_memory: Union[bool, int, SharedMemoryRing] = False):
+		'''
+		:param batches: the batches to prepare (typically a generator creating a batch for each planner info)
+		:param gizmos: the gizmos to grab in each batch ahead of time
+		:param prefetch: maximum number of batches being prepared at once
+		:param workers: number of workers (only used if a new executor is created)
+		:param executor: either 'thread' or 'process' (to create a new pool) or an existing executor
+		:param shared_memory: whether to send arrays from worker processes using shared memory (optionally the
+		size of each slot in bytes, or the ring to use)
+		'''
+		assert prefetch > 0, 'prefetch must be positive'
+		if isinstance(executor, str) and executor not in {'thread', 'process'}:
+			raise ValueError(f'Unknown executor: {executor!r} (expected "thread" or "process")')
+		self._batches = batches
+		self._gizmos = tuple(gizmos)
+		self._prefetch = prefetch
+		self._workers = workers
+		self._executor = executor
+		self._shared_memory = shared_memory
+
+
+	def _create_ring(self) -> Optional[SharedMemoryRing]:
+		shared = self._shared_memory
+		if shared is False or shared is None:
+			return None
+		if isinstance(shared, SharedMemoryRing):
+			return shared
+		slots = 2 * self._prefetch + 2 # batches in flight, and some kept by the consumer
+		return SharedMemoryRing(slots) if shared is True else SharedMemoryRing(slots, shared)
+
+
+	def _create_executor(self, kind: str) -> Executor:
+		if kind == 'thread':
+			return ThreadPoolExecutor(self._workers, thread_name_prefix='omniply-prefetch')
+		return ProcessPoolExecutor(self._workers)
+
+
+	def __iter__(self) -> Iterator[AbstractBatch]:
+		executor = self._executor
+		owned = isinstance(executor, str)
+		if owned:
+			executor = self._create_executor(executor)
+		remote = not isinstance(executor, ThreadPoolExecutor)
+		ring = self._create_ring() if remote else None
+
+		batches = iter(self._batches)
+		pending = deque()
+		exhausted = False
+		try:
+			while True:
+				while not exhausted and len(pending) < self._prefetch:
+					try:
+						batch = next(batches)
+					except (StopIteration, BudgetExceeded):
+						exhausted = True
+						continue
+					slot = None
+					if ring is not None:
+						slot = ring.acquire()
+						job = executor.submit(_prepare_shared, batch, self._gizmos,
+											  None if slot is None else ring.location(slot))
+					else:
+						job = executor.submit(_prepare_remote if remote else _prepare, batch, self._gizmos)
+					pending.append((batch, job, slot))
+				if not pending:
+					break
+				batch, job, slot = pending.popleft()
+				try:
+					out = job.result()
+				except BaseException:
+					if slot is not None:
+						ring.release(slot)
+					raise
+				if ring is not None:
+					out, placed = out
+					if slot is not None:
+						ring.receive(batch, slot, placed)
+				if remote:
+					for gizmo, value in out.items():
+						if gizmo not in batch.data:
+							batch[gizmo] = value
+				yield batch
+		finally:
+			jobs = [job for _, job, _ in pending if not job.cancel()]
+			wait(jobs) # so no worker is still using a batch once the iteration is done
+			if ring is not None:
+				for _, _, slot in pending:
+					if slot is not None:
+						ring.release(slot)
+			if owned:
+				executor.shutdown(wait=True)
+			if ring is not None and ring is not self._shared_memory:
+				ring.close()
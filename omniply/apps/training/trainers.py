@@ -1,9 +1,12 @@
 from .imports import *
+from contextlib import closing
+from concurrent.futures import Executor
 
 from .abstract import AbstractTrainer, AbstractDataset, AbstractBatch, AbstractPlanner
 from .planners import Indexed, BudgetExceeded
-from .batches import Batch
+from .batches import Batch, recycle_batches
 from .datasets import Dataset
+from .prefetch import Prefetcher
 
 
 
@@ -23,25 +26,54 @@ class TrainerBase(ToolKit, AbstractTrainer):
 		return False
 	
 
+	def prefetch_gizmos(self, src: Dataset) -> Iterator[str]:
+		'''gizmos to grab ahead of time when prefetching batches (by default everything the dataset provides)'''
+		yield from src.gizmos()
+
+
 	_Planner = Indexed
 	_Batch = None #Batch
-	def fit_loop(self, src: Dataset, **settings: Any) -> Iterator[Batch]:
-		'''train the model'''
+	_Prefetcher = Prefetcher
+	def fit_loop(self, src: Dataset, *, prefetch: int = 0, workers: int = 1,
+				 executor: Union[str, Executor] = 'thread', shared_memory: Union[bool, int] = False,
+				 planner_state: Optional[Dict[str, Any]] = None, recycle: bool = False,
+				 **settings: Any) -> Iterator[Batch]:
+		'''
+		train the model
+
+		:param prefetch: if positive, up to this many batches are prepared in the background (see `Prefetcher`)
+		:param workers: number of workers preparing batches
+		:param executor: 'thread', 'process' or an existing executor to prepare batches with
+		:param shared_memory: send arrays from worker processes using shared memory (see `SharedMemoryRing`)
+		:param planner_state: resume training right after the batch with this `planner_state` (or from a checkpoint
+		of `planner.state_dict()`)
+		:param recycle: reuse a few batch objects (see `Batch.reset`) instead of creating a new batch for each step,
+		so a batch is only valid until the next one is requested (ignored with `shared_memory`)
+		'''
 		planner = self._Planner(src, **settings)
+		if planner_state is not None:
+			planner.load_state_dict(planner_state)
 
 		batch_size = 32 if self._batch_size is None else self._batch_size
 
 		num_itr = planner.expected_iterations(batch_size) # to get the total number of iterations
 
 		batch_cls = self._Batch or getattr(src, '_Batch', None) or Batch
-		for info in planner.generate(batch_size):
-			batch = batch_cls(info, planner=planner).include(src, self)
-
-			# Note: this runs the optimization step before yielding the batch
-			yield self.learn(batch)
-
-			if self._terminate_fit(batch):
-				break
+		create = lambda info: batch_cls(info, planner=planner).include(src, self)
+		if recycle and not (prefetch and shared_memory):
+			batches = recycle_batches(planner.generate(batch_size), create, pool=prefetch + 1)
+		else:
+			batches = (create(info) for info in planner.generate(batch_size))
+		if prefetch:
+			batches = iter(self._Prefetcher(batches, self.prefetch_gizmos(src), prefetch=prefetch, workers=workers,
+											executor=executor, shared_memory=shared_memory))
+		with closing(batches): # stops the prefetching workers when the training ends early
+			for batch in batches:
+				# Note: this runs the optimization step before yielding the batch
+				yield self.learn(batch)
+
+				if self._terminate_fit(batch):
+					break
 
 
 	def fit(self, src: Dataset) -> Self:
@@ -102,3 +102,299 @@ def test_trainer():
 
 
 
+def test_prefetch():
+    import threading
+
+    loaded = []
+
+    class _Toy(Dataset):
+        @tool('x')
+        def x(self, index):
+            loaded.append(threading.get_ident())
+            return index * 2
+
+        @property
+        def size(self) -> int:
+            return 10
+
+    toy = _Toy()
+    expected = [batch['x'].tolist() for batch in toy.iterate(3)]
+    loaded.clear()
+    assert [batch['x'].tolist() for batch in toy.iterate(3, prefetch=2, workers=2)] == expected
+    assert threading.get_ident() not in loaded # everything was loaded in the background
+
+    class _Trainer(TrainerBase):
+        def learn(self, batch):
+            return batch
+
+        def _terminate_fit(self, batch):
+            return batch['num_iterations'] >= 3
+
+    expected = [batch['index'].tolist() for batch in _Trainer(batch_size=4).fit_loop(toy, max_epochs=10, seed=0)]
+    batches = list(_Trainer(batch_size=4).fit_loop(toy, max_epochs=10, seed=0, prefetch=4, workers=2))
+    assert [batch['index'].tolist() for batch in batches] == expected # stops at the same batch
+    assert all(batch.is_cached('x') for batch in batches)
+
+class _Images(Dataset):
+    @tool('image')
+    def image(self, index):
+        import numpy as np
+        return np.ones((len(index), 4, 4), dtype=np.float32) * np.asarray(index)[:, None, None]
+
+    @property
+    def size(self) -> int:
+        return 12
+
+
+def test_shared_memory():
+    import gc
+    from .prefetch import SharedMemoryRing
+
+    ring = SharedMemoryRing(3, 2**12)
+    batches = list(_Images().iterate(4, prefetch=2, executor='process', shared_memory=ring))
+    assert ring.fallbacks == 0 and not ring._free # the arrays of all batches are in shared memory
+    for batch in batches:
+        assert batch.is_cached('image') and not batch['image'].flags.owndata
+        assert (batch['image'][:, 0, 0] == batch['index']).all()
+
+    del batches, batch
+    gc.collect()
+    assert len(ring._free) == 3 # released once the batches are dropped
+    ring.close()
+
+def test_index_stream():
+    import numpy as np
+    from .planners import InfiniteIndexed
+
+    class _Src:
+        size = 10
+
+    planner = InfiniteIndexed(_Src(), seed=0)
+    planner.draw(3)
+    order = planner._order.copy()
+    planner.draw(4)
+    assert (planner._order == order).all() # sorting the batch doesn't touch the order of the epoch
+
+    info = planner.draw(25) # wraps around several epochs at once
+    assert len(info['index']) == 25 and (np.diff(info['index']) >= 0).all()
+    assert planner._drawn_epochs == 4 and planner._offset == 2
+    assert np.bincount(info['index'], minlength=10).min() >= 2
+
+    a, b = InfiniteIndexed(_Src(), seed=1, precompute=True), InfiniteIndexed(_Src(), seed=1)
+    for _ in range(10):
+        assert (a.draw(7)['index'] == b.draw(7)['index']).all()
+    assert a._upcoming is not None and b._upcoming is None # precomputing is opt-in
+    assert a._upcoming[1].result() is not None
+    assert a._background()._thread_name_prefix == 'omniply-planner' # (not shared with other thread pools)
+
+def test_resume_planner():
+    import json
+    from .planners import Indexed
+
+    class _Toy(Dataset):
+        @property
+        def size(self) -> int:
+            return 10
+
+    class _Trainer(TrainerBase):
+        def learn(self, batch):
+            return batch
+
+    settings = dict(max_epochs=3, seed=4)
+    full = [batch['index'].tolist() for batch in _Trainer(batch_size=4).fit_loop(_Toy(), **settings)]
+
+    for stop in [2, 5]: # mid-epoch and right after a wrap
+        batches = _Trainer(batch_size=4).fit_loop(_Toy(), **settings)
+        seen = [next(batches) for _ in range(stop)]
+        state = json.loads(json.dumps(seen[-1]['planner_state'])) # e.g. stored in a checkpoint
+        resumed = [batch['index'].tolist() for batch in
+                   _Trainer(batch_size=4).fit_loop(_Toy(), planner_state=state, **settings)]
+        assert [batch['index'].tolist() for batch in seen] + resumed == full
+
+    planner = Indexed(_Toy(), max_epochs=1, seed=1)
+    planner.step(3)
+    other = Indexed(_Toy(), max_epochs=1)
+    other.load_state_dict(planner.state_dict())
+    assert other.step(3)['index'].tolist() == planner.step(3)['index'].tolist()
+
+def test_sharded_planner():
+    from .planners import Indexed
+
+    class _Toy(Dataset):
+        @property
+        def size(self) -> int:
+            return 10
+
+    for drop_uneven, epoch_size in [(False, 4), (True, 3)]:
+        shards = [Indexed(_Toy(), seed=5, shard=i, num_shards=3, max_epochs=2, drop_uneven=drop_uneven)
+                  for i in range(3)]
+        assert [planner.expected_iterations(1) for planner in shards] == [2 * epoch_size] * 3
+
+        streams = [[info['index'][0] for info in planner.generate(1)] for planner in shards]
+        assert [len(stream) for stream in streams] == [2 * epoch_size] * 3 # the same number of batches everywhere
+        first = [i for stream in streams for i in stream[:epoch_size]] # first epoch of all shards
+        if drop_uneven:
+            assert len(set(first)) == 9 # disjoint
+        else:
+            assert set(first) == set(range(10)) and len(first) == 12 # padded with two samples
+
+def test_bucketed_planner():
+    import numpy as np
+    from .planners import BucketedIndexed
+
+    lengths = np.random.RandomState(0).randint(1, 100, size=200)
+
+    class _Sequences(Dataset):
+        @tool('length')
+        def length(self, index):
+            return lengths[index]
+
+        @property
+        def size(self) -> int:
+            return len(lengths)
+
+    planner = BucketedIndexed(_Sequences(), size_key='length', num_buckets=4, max_epochs=2, seed=0)
+    expected = planner.expected_iterations(16)
+    infos = list(planner.generate(16))
+    assert len(infos) == expected
+    for epoch in [infos[:expected // 2], infos[expected // 2:]]:
+        assert sorted(i for info in epoch for i in info['index']) == list(range(200)) # every sample once
+    for info in infos: # every batch contains samples of a single bucket
+        assert len(set(planner._buckets[info['index']])) == 1 and info['size'] == len(info['index']) <= 16
+
+    planner = BucketedIndexed(_Sequences(), sizes=lengths, max_elements=400, max_epochs=1)
+    infos = list(planner.generate(16))
+    assert all(len(info['index']) * lengths[info['index']].max() <= 400 for info in infos)
+    assert sum(info['size'] for info in infos) == 200
+
+def test_weighted_planners():
+    import numpy as np
+    from .planners import WeightedIndexed, StratifiedIndexed, alias_table
+
+    weights = np.array([0., 1., 2., 3., 10.])
+    prob, alias = alias_table(weights)
+    exact = prob.copy()
+    np.add.at(exact, alias, 1 - prob)
+    assert np.allclose(exact / len(weights), weights / weights.sum()) # the table is exact
+
+    class _Toy(Dataset):
+        def __init__(self, small: bool = True, **kwargs):
+            super().__init__(**kwargs)
+            self._small = small
+
+        @tool('weight')
+        def weight(self, index):
+            return weights[index]
+
+        @tool('label')
+        def label(self, index):
+            return np.where(index < 4, 'rare', 'common') # rare: 4 of 40 samples
+
+        @property
+        def size(self) -> int:
+            return len(weights) if self._small else 40
+
+    planner = WeightedIndexed(_Toy(), epoch_samples=10000, max_epochs=1, seed=0)
+    indices = np.concatenate([info['index'] for info in planner.generate(100)])
+    assert len(indices) == 10000 and 0 not in indices
+    assert np.abs(np.bincount(indices, minlength=5) / 10000 - weights / weights.sum()).max() < 0.02
+    again = WeightedIndexed(_Toy(), epoch_samples=10000, max_epochs=1, seed=0)
+    assert (np.concatenate([info['index'] for info in again.generate(100)]) == indices).all()
+
+    planner = StratifiedIndexed(_Toy(small=False), max_epochs=2, seed=0)
+    for info in planner.generate(8):
+        assert (info['index'] < 4).sum() == 4 # every batch is balanced (since it is aligned to the rounds)
+
+    strata = np.arange(40) % 3
+    planner = StratifiedIndexed(_Toy(small=False), strata=strata, epoch_samples=30, seed=0)
+    for seed in range(5):
+        rounds = strata[planner._epoch_order(seed)].reshape(-1, 3)
+        assert (np.sort(rounds, axis=1) == [0, 1, 2]).all() # every round contains each stratum exactly once
+
+
+def test_recycle_batches():
+    class _Toy(Dataset):
+        @tool('x')
+        def x(self, index):
+            return index * 2
+
+        @property
+        def size(self) -> int:
+            return 10
+
+    toy = _Toy()
+    expected = [batch['x'].tolist() for batch in toy.iterate(3)]
+    seen = set()
+    values = []
+    for batch in toy.iterate(3, recycle=True):
+        values.append(batch['x'].tolist())
+        seen.add(id(batch))
+    assert values == expected and len(seen) == 1 # a single batch object was reused
+    assert [batch['x'].tolist() for batch in toy.iterate(3, recycle=True, prefetch=2)] == expected
+
+    batch = next(iter(toy.iterate(3, recycle=True)))
+    assert batch['x'].tolist() == [0, 2, 4]
+    batch.reset({'index': batch['index'] + 1, 'size': 3, 'extra': 'new'}) # different keys
+    assert not batch.is_cached('x') and batch['x'].tolist() == [2, 4, 6] and batch['extra'] == 'new'
+
+    class _Trainer(TrainerBase):
+        def learn(self, batch):
+            return batch
+
+        def _terminate_fit(self, batch):
+            return batch['num_iterations'] >= 5
+
+    expected = [batch['x'].tolist() for batch in _Trainer(batch_size=4).fit_loop(toy, max_epochs=10, seed=0)]
+    assert [batch['x'].tolist() for batch in _Trainer(batch_size=4).fit_loop(toy, max_epochs=10, seed=0,
+                                                                             recycle=True)] == expected
+
+def test_cached_dataset():
+    import os
+    import tempfile
+    import numpy as np
+    from .datasets import CachedDataset
+
+    decoded = []
+
+    class _Toy(Dataset):
+        @tool('image')
+        def image(self, index):
+            decoded.extend(np.atleast_1d(index).tolist())
+            return np.ones((*np.shape(index), 2, 2)) * np.asarray(index)[..., None, None]
+
+        @tool('label')
+        def label(self, index):
+            return np.where(np.asarray(index) % 2, 'odd', 'even')
+
+        @tool('brightness')
+        def brightness(self, image):
+            return image.mean(axis=(-1, -2))
+
+        @property
+        def size(self) -> int:
+            return 10
+
+    cached = CachedDataset(_Toy(), ['image', 'label'])
+    assert cached.size == 10
+    labels = [batch['label'].tolist() for batch in cached.iterate(4) if batch['image'] is not None]
+    assert sorted(decoded) == list(range(10)) and cached.cache.complete and cached.cache.hits == 0
+
+    class _Trainer(TrainerBase):
+        def learn(self, batch):
+            assert (batch['image'][:, 0, 0] == batch['index']).all()
+            assert (batch['brightness'] == batch['index']).all() # computed from the recorded images
+            return batch
+
+    for _ in _Trainer(batch_size=4).fit_loop(cached, max_epochs=3, seed=0): pass
+    assert len(decoded) == 10 and cached.cache.misses == 6 # 3 batches per gizmo in the first epoch
+    assert [batch['label'].tolist() for batch in cached.iterate(4)] == labels
+
+    with tempfile.TemporaryDirectory() as root:
+        spilled = CachedDataset(_Toy(), ['image'], memory_budget=100, spill_dir=root)
+        for batch in spilled.iterate(3):
+            batch['image']
+        assert isinstance(spilled.cache._columns['image'][0], np.memmap) and spilled.cache.complete
+        assert os.listdir(root) and spilled.cache.memory_used == 0
+        assert (np.concatenate([batch['image'][:, 0, 0] for batch in spilled.iterate(3)]) == np.arange(10)).all()
+        spilled.cache.clear()
+        assert not os.listdir(root)
@@ -305,6 +305,74 @@ def test_rebuild_chain():
 	assert ctx['prec'] == -100
 
 
+
+def test_array_table():
+	import numpy as np
+	import tempfile
+	from .gaps import ArrayTable
+
+	tbl = ArrayTable.from_rows([{'a': 1, 'b': 'x', 'c': [1, 2]},
+								{'a': 2, 'b': 'y', 'c': [3]},
+								{'a': 3, 'b': 'z', 'c': []}])
+	assert tbl.data['a'].dtype.kind == 'i' and tbl.data['b'].dtype.kind == 'U' and tbl.data['c'].dtype == object
+
+	ctx = Context(tbl, DictGadget({'index': np.array([0, 1])}))
+	assert ctx['a'].tolist() == [1, 2]
+	assert np.shares_memory(ctx['a'], tbl.data['a']) # contiguous rows are not copied
+
+	ctx = Context(tbl, DictGadget({'index': np.array([2, 0])}))
+	assert ctx['b'].tolist() == ['z', 'x']
+	assert ctx['c'].tolist() == [[], [1, 2]]
+
+	ctx = Context(tbl, DictGadget({'index': np.array([-2, -1])}))
+	assert ctx['a'].tolist() == [2, 3] # negative indices count from the end (rather than making an empty slice)
+	assert tbl.gather('a', [-1, 0]).tolist() == [3, 1]
+
+	with tempfile.TemporaryDirectory() as root:
+		ArrayTable.from_columns({'a': [1., 2., 3.], 'b': [[1, 2], [3, 4], [5, 6]]}).to_npy(root)
+		tbl = ArrayTable.from_npy(root)
+		tbl.gauge_apply({'b': 'd'})
+		assert isinstance(tbl.data['a'], np.memmap)
+		ctx = Context(tbl, DictGadget({'index': [1, 2]}))
+		assert ctx['d'].tolist() == [[3, 4], [5, 6]]
+		del tbl, ctx
+
+
+def test_lazy_tables():
+	import numpy as np
+	import tempfile
+	import h5py
+	from .gaps import ArrayTable, HDF5Table, NpyDirTable
+
+	x = np.arange(30).reshape(10, 3)
+	y = np.arange(10) * 2.
+	with tempfile.TemporaryDirectory() as root:
+		with h5py.File(f'{root}/data.h5', 'w') as f:
+			f.create_dataset('x', data=x, chunks=(4, 3))
+			f.create_dataset('y', data=y, chunks=(4,))
+		tbl = HDF5Table(f'{root}/data.h5', cache_chunks=2)
+		tbl.gauge_apply({'y': 'z'})
+		assert not tbl.is_loaded
+
+		ctx = Context(tbl, DictGadget({'index': np.array([9, 0, 1])}))
+		assert ctx['x'].tolist() == x[[9, 0, 1]].tolist()
+		assert tbl.chunk_size == 4 and tbl.chunk_reads == 2 # only the chunks that contain the rows are read
+		assert ctx['z'].tolist() == y[[9, 0, 1]].tolist()
+		assert tbl.chunk_reads == 4
+
+		ctx = Context(tbl, DictGadget({'index': np.array([8, 1])}))
+		assert ctx['z'].tolist() == [16., 2.] and tbl.chunk_reads == 4 and tbl.chunk_hits == 2
+		assert tbl.gather('x', -1).tolist() == [27, 28, 29]
+		tbl.close()
+
+		ArrayTable.from_columns({'x': x, 'y': y}).to_npy(f'{root}/npy')
+		tbl = NpyDirTable(f'{root}/npy', columns=['y'], chunk_size=3)
+		ctx = Context(tbl, DictGadget({'index': [4, 5, 6]}))
+		assert ctx['y'].tolist() == [8., 10., 12.]
+		assert tbl.columns == ('y',) and tbl.chunk_reads == 2
+		del tbl, ctx
+
+
 # endregion
 
 # region Staging
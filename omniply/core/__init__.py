@@ -1,3 +1,6 @@
 from .abstract import AbstractGadget, AbstractGaggle, AbstractGame
 from .errors import GadgetFailed, MissingGadget, GrabError, SkipGadget
-from .op import tool, ToolKit, Context, Mechanism, Gate
\ No newline at end of file
+from .garbage import LRUCachePolicy, LFUCachePolicy
+from .persistence import DiskCache
+from .batching import grab_many
+from .op import tool, ToolKit, Context, LeanContext, ParallelContext, Mechanism, Gate
\ No newline at end of file
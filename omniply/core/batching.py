@@ -0,0 +1,266 @@
+from typing import Any, Optional, Iterable, Sequence, Union
+import sys
+
+from .abstract import AbstractGame, AbstractGadget, AbstractGadgetError, _unique_game_default_value
+from .errors import GadgetFailed
+from .games import TraceGame
+from .genetics import AutoFunctionGadget
+
+
+
+def stack_values(values: Sequence[Any]) -> Any:
+	"""
+	Stacks the values of a gizmo from several contexts along a new first (batch) dimension.
+
+	Arrays and numbers are stacked into a single array (if numpy is available), anything else is kept as a list.
+
+	Args:
+		values (Sequence[Any]): The values to stack (one per context).
+
+	Returns:
+		Any: The stacked values.
+	"""
+	np = sys.modules.get('numpy')
+	if np is not None and len(values) and all(isinstance(value, (np.ndarray, np.generic, int, float, complex, bool))
+											  for value in values):
+		return np.stack([np.asarray(value) for value in values])
+	return list(values)
+
+
+def unstack_values(out: Any, size: int, order: Optional[Sequence[str]] = None) -> list[Any]:
+	"""
+	Splits the (stacked) output of a batched function into the outputs for each context.
+
+	Args:
+		out (Any): The stacked output, or for multiple outputs (if `order` is given) a dict or tuple of stacked outputs.
+		size (int): The number of contexts.
+		order (Optional[Sequence[str]]): The gizmos of a function with multiple outputs.
+
+	Returns:
+		list[Any]: The outputs for each context (for multiple outputs, each is a dict).
+	"""
+	if order is None:
+		if len(out) != size:
+			raise ValueError(f'Expected batched output of length {size}, got {len(out)}')
+		return list(out)
+	if isinstance(out, tuple):
+		out = dict(zip(order, out))
+	columns = {gizmo: unstack_values(out[gizmo], size) for gizmo in order}
+	return [{gizmo: column[i] for gizmo, column in columns.items()} for i in range(size)]
+
+
+def restack_values(outs: Sequence[Any], order: Optional[Sequence[str]] = None) -> Any:
+	"""
+	Stacks the outputs of a function for each sample (inverse of `unstack_values`).
+
+	Args:
+		outs (Sequence[Any]): The output for each sample (for multiple outputs, each is a dict or tuple).
+		order (Optional[Sequence[str]]): The gizmos of a function with multiple outputs.
+
+	Returns:
+		Any: The stacked outputs (for multiple outputs, a dict of stacked outputs).
+	"""
+	if order is None:
+		return stack_values(outs)
+	outs = [dict(zip(order, out)) if isinstance(out, tuple) else out for out in outs]
+	return {gizmo: stack_values([out[gizmo] for out in outs]) for gizmo in order}
+
+
+
+class BatchedGadget(AutoFunctionGadget):
+	"""
+	Mix-in for function gadgets to bridge between functions written per-sample and per-batch.
+
+	A batched function expects all parents stacked along a new first (batch) dimension and returns the outputs
+	stacked in the same way (see `stack_values`). With `grab_many` the function is called once for all contexts, in
+	a batch (see `BatchGame._stacked_size`) it is called directly, and when grabbing from any other (single sample)
+	context, the function is called with a batch of size 1 (and the output is unwrapped).
+
+	A vectorized function is written per-sample, so when grabbed from a batch, it is called for each sample (each
+	parent is indexed along the first dimension) and the outputs are stacked. Otherwise it is called directly.
+	"""
+
+	def __init__(self, *args, batched: bool = False, vectorized: Union[bool, Iterable[str]] = False, **kwargs):
+		"""
+		Args:
+			batched (bool): Whether the function expects (and returns) stacked values.
+			vectorized (Union[bool, Iterable[str]]): Whether the function should be mapped over the samples of a
+			batch, optionally only the names of the arguments which are stacked (the others are passed as is).
+		"""
+		if batched and vectorized:
+			raise ValueError(f'A function can either be batched or vectorized, not both')
+		super().__init__(*args, **kwargs)
+		self._batched = batched
+		self._vectorized = vectorized if isinstance(vectorized, bool) else frozenset(vectorized)
+
+
+	def _batch_order(self, gizmo: str = None) -> Optional[tuple[str, ...]]:
+		'''the gizmos of a function with multiple outputs (or None)'''
+		order = getattr(self, '_multi_output_order', None)
+		return None if order is None else order(gizmo)
+
+
+	def _grab_from(self, ctx: 'AbstractGame') -> Any:
+		if not self._batched and not self._vectorized:
+			return super()._grab_from(ctx)
+		stacked = getattr(ctx, '_stacked_size', None)
+		size = None if stacked is None else stacked()
+		conditions = {param.name: self._find_missing_gene(ctx, param) for param in self._extract_missing_genes()}
+		if self._batched:
+			if size is not None:
+				return self._call_fn(conditions)
+			conditions = {name: stack_values([value]) for name, value in conditions.items()}
+			return unstack_values(self._call_fn(conditions), 1, self._batch_order())[0]
+		if size is None:
+			return self._call_fn(conditions)
+		mapped = conditions.keys() if self._vectorized is True else self._vectorized
+		outs = [self._call_fn({name: value[i] if name in mapped else value for name, value in conditions.items()})
+				for i in range(size)]
+		return restack_values(outs, self._batch_order())
+
+
+	def grab_batch_from(self, contexts: Sequence[AbstractGame], gizmo: str) -> list[Any]:
+		"""
+		Grabs the gizmo for all contexts at once by calling the function on the stacked parents.
+
+		Args:
+			contexts (Sequence[AbstractGame]): The contexts to grab the gizmo from.
+			gizmo (str): The gizmo to grab.
+
+		Returns:
+			list[Any]: The gizmo for each context (not cached yet).
+
+		Raises:
+			GadgetFailed: If a parent can only be grabbed from some of the contexts.
+		"""
+		missing = object()
+		conditions = {}
+		for param in self._extract_missing_genes():
+			values = grab_many(contexts, self._arg_map.get(param.name, param.name), default=missing)
+			if all(value is missing for value in values) and param.default is not param.empty:
+				conditions[param.name] = stack_values([param.default] * len(contexts))
+			elif any(value is missing for value in values):
+				raise GadgetFailed(f'{param.name!r} could only be grabbed from some of the contexts')
+			else:
+				conditions[param.name] = stack_values(values)
+		order = self._batch_order(gizmo)
+		outs = unstack_values(self._call_fn(conditions), len(contexts), order)
+		if order is None:
+			return outs
+		return [self._split_multi_output(ctx, gizmo, out) for ctx, out in zip(contexts, outs)]
+
+
+
+class BatchGame(TraceGame):
+	"""
+	Mix-in for games to grab a gizmo from many similar contexts at once (see `grab_many`).
+	"""
+
+	def _stacked_size(self) -> Optional[int]:
+		"""
+		Returns the number of samples if the values in this game are stacked along a first (batch) dimension, or None
+		if this game contains a single sample (default).
+		"""
+		return None
+
+
+	@staticmethod
+	def grab_many(contexts: Iterable[AbstractGame], gizmo: str, default: Any = _unique_game_default_value) -> list[Any]:
+		return grab_many(contexts, gizmo, default=default)
+
+
+	def _grab_using(self, gadget: AbstractGadget, gizmo: str) -> Any:
+		"""
+		Computes and caches a gizmo using a specific gadget (which must be the gadget this game would choose).
+
+		Args:
+			gadget (AbstractGadget): The gadget to use.
+			gizmo (str): The gizmo to compute.
+
+		Returns:
+			Any: The computed gizmo.
+		"""
+		tracing, partial_grabs = self._tracing, self._partial_grabs
+		tracing.append(gizmo)
+		partial_grabs.append(gizmo) # so parents are traced as usual
+		try:
+			val = gadget.grab_from(self, gizmo)
+		finally:
+			partial_grabs.pop()
+			tracing.pop()
+		self._cache_computed(gizmo, val)
+		return val
+
+
+	def _cache_computed(self, gizmo: str, val: Any, parents: Iterable[str] = ()) -> None:
+		"""
+		Caches a gizmo which was computed outside of this game (e.g. by a batched gadget).
+
+		Args:
+			gizmo (str): The computed gizmo.
+			val (Any): The value of the gizmo.
+			parents (Iterable[str]): The gizmos the value was computed from (to be traced).
+		"""
+		self[gizmo] = val
+		self._admit_cache(gizmo, val)
+		for parent in parents:
+			self._products.setdefault(parent, set()).add(gizmo)
+
+
+
+def grab_many(contexts: Iterable[AbstractGame], gizmo: str, default: Any = _unique_game_default_value) -> list[Any]:
+	"""
+	Grabs the same gizmo from many contexts (e.g. one frame per sample).
+
+	Instead of resolving which gadget to use for every context, the contexts are grouped by the vendors they have for
+	the gizmo, and the gadget is chosen once per group. Batched gadgets (e.g. `tool(..., batched=True)`) are called
+	once per group on the stacked parents (which are themselves grabbed using `grab_many`), and the outputs are
+	scattered back into the cache of each context.
+
+	If anything fails (or a context is recording), the context falls back to a regular `grab`, so the result is always
+	the same as `[ctx.grab(gizmo) for ctx in contexts]`.
+
+	Args:
+		contexts (Iterable[AbstractGame]): The contexts to grab from.
+		gizmo (str): The gizmo to grab.
+		default (Any): The value to use for contexts where the gizmo cannot be grabbed. If not specified, the error
+		is raised.
+
+	Returns:
+		list[Any]: The gizmo for each context (in the same order).
+	"""
+	contexts = list(contexts)
+	out = [None] * len(contexts)
+	groups = {}
+	for i, ctx in enumerate(contexts):
+		table = getattr(ctx, '_gadgets_table', None)
+		if (isinstance(ctx, BatchGame) and gizmo not in ctx.data and table is not None and gizmo in table
+				and getattr(ctx, '_active_recording', None) is None):
+			groups.setdefault(tuple(table[gizmo]), []).append(i)
+		else:
+			out[i] = ctx.grab(gizmo, default)
+
+	for indices in groups.values():
+		members = [contexts[i] for i in indices]
+		gadget = next(members[0]._gadgets(gizmo))
+		vals = None
+		if getattr(gadget, '_batched', False) and len(members) > 1:
+			try:
+				vals = gadget.grab_batch_from(members, gizmo)
+			except AbstractGadgetError:
+				pass
+			else:
+				parents = [parent for gene in gadget.genes(gizmo) if gene.parents is not None
+						   for parent in gene.parents]
+				for ctx, val in zip(members, vals):
+					ctx._cache_computed(gizmo, val, parents)
+		if vals is None:
+			vals = []
+			for ctx in members:
+				try:
+					vals.append(ctx._grab_using(gadget, gizmo))
+				except AbstractGadgetError:
+					vals.append(ctx.grab(gizmo, default)) # the regular grab takes care of any failures
+		for i, val in zip(indices, vals):
+			out[i] = val
+	return out
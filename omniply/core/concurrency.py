@@ -0,0 +1,321 @@
+from typing import Any, Optional, Union, Callable
+import sys
+import inspect
+import asyncio
+import importlib
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+
+from .abstract import AbstractGame, AbstractGadgetError, _unique_game_default_value
+from .errors import MissingGadget
+from .games import CacheGame, TraceGame
+from .genetics import AbstractGenetic, AutoFunctionGadget
+
+
+
+class AsyncGame(CacheGame):
+	"""
+	Mix-in for games to grab gizmos asynchronously using `agrab` (or `agrab_many`).
+
+	Gadgets that support it (e.g. tools, including `async def` tools) resolve all their parents concurrently, so
+	independent I/O bound parents (e.g. fetching from remote storage) overlap rather than being awaited one after
+	the other. Gadgets that don't support async grabbing (e.g. gates) are grabbed synchronously as usual (after their
+	parents were prefetched concurrently), in which case any async tools they use block the event loop. Concurrent
+	requests for the same gizmo share a single in-flight computation.
+
+	Note that gizmos grabbed asynchronously are not traced (just like the fast path of `LeanContext`), and graces
+	(e.g. `repeat`) are only applied to gadgets that are grabbed synchronously.
+	"""
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._inflight = {} # gizmo -> future of the ongoing computation (only within the current event loop)
+
+
+	def __getstate__(self):
+		state = super().__getstate__() if hasattr(super(), '__getstate__') else self.__dict__
+		state = state.copy()
+		state['_inflight'] = {}
+		return state
+
+
+	async def agrab(self, gizmo: str, default: Any = _unique_game_default_value) -> Any:
+		"""
+		Asynchronously grabs a gizmo (analogous to `grab`).
+
+		Args:
+			gizmo (str): The gizmo to grab.
+			default (Any): The default value to return if the gizmo cannot be grabbed. If not specified, the error
+			is raised.
+
+		Returns:
+			Any: The grabbed gizmo, or the default value if the gizmo cannot be grabbed and a default value is provided.
+
+		Raises:
+			AbstractGadgetError: If the gizmo cannot be grabbed and no default value is provided.
+		"""
+		try:
+			if gizmo in self.data:
+				return self.grab(gizmo)
+			pending = self._inflight.get(gizmo)
+			if pending is not None:
+				return await asyncio.shield(pending)
+			pending = self._inflight[gizmo] = asyncio.get_running_loop().create_future()
+			try:
+				val = await self._agrab_miss(gizmo)
+			except asyncio.CancelledError:
+				pending.cancel()
+				raise
+			except BaseException as exc:
+				pending.set_exception(exc)
+				pending.exception() # mark the error as retrieved (it is raised here anyway)
+				raise
+			else:
+				pending.set_result(val)
+			finally:
+				del self._inflight[gizmo]
+			return val
+		except AbstractGadgetError:
+			if default is _unique_game_default_value:
+				raise
+			return default
+
+
+	async def agrab_many(self, *gizmos: str) -> list[Any]:
+		"""
+		Asynchronously grabs all given gizmos concurrently.
+
+		Args:
+			gizmos (str): The gizmos to grab.
+
+		Returns:
+			list[Any]: The grabbed gizmos (in the same order).
+		"""
+		return list(await asyncio.gather(*[self.agrab(gizmo) for gizmo in gizmos]))
+
+
+	async def _agrab_miss(self, gizmo: str) -> Any:
+		"""
+		Computes a gizmo which is not cached yet, and caches it.
+
+		Args:
+			gizmo (str): The gizmo to compute.
+
+		Returns:
+			Any: The computed gizmo.
+		"""
+		gadget = next(self._gadgets(gizmo), None)
+		if gadget is None:
+			raise MissingGadget(gizmo)
+		agrab_from = getattr(gadget, 'agrab_from', None)
+		if agrab_from is None:
+			# prefetch the parents concurrently, so the synchronous grab only uses cached (or sync) parents
+			if isinstance(gadget, AbstractGenetic):
+				parents = {parent for gene in gadget.genes(gizmo) if gene.parents is not None
+						   for parent in gene.parents}
+				parents.difference_update(self.data)
+				await asyncio.gather(*[self.agrab(parent, None) for parent in parents])
+			return self.grab(gizmo)
+		val = await agrab_from(self, gizmo)
+		if gizmo not in self.data:
+			self[gizmo] = val
+			self._admit_cache(gizmo, val)
+		return val
+
+
+
+class ParallelGame(TraceGame):
+	"""
+	Mix-in for games to resolve independent parents of a gizmo concurrently using a thread pool.
+
+	Whenever a gizmo is computed, the genes of its gadget are used to find the parents that are not cached yet. If
+	there are several, all but one are grabbed by the executor while the current thread grabs the remaining one, and
+	only once all of them are done is the gadget called (which then finds all its parents cached). This pays off for
+	latency-heavy gadgets (e.g. I/O or native code releasing the GIL) in wide dependency graphs.
+
+	Each gizmo is computed by at most one thread at a time (others wait for it), so gizmos shared by several branches
+	are only computed once and the trace (used by `undo` and `purge`) is the same as when grabbing sequentially. Jobs
+	which haven't started by the time they are needed are run by the waiting thread instead, so nested fan-outs never
+	deadlock, even with a small pool.
+
+	Attributes:
+		_executor (Optional[Executor]): The executor to use (by default a thread pool shared by all games).
+	"""
+
+	_shared_executor = None
+	_shared_executor_lock = threading.Lock()
+
+	def __init__(self, *args, executor: Optional[Executor] = None, **kwargs):
+		"""
+		Args:
+			executor (Optional[Executor]): The executor to resolve parents with. Defaults to a shared thread pool.
+		"""
+		super().__init__(*args, **kwargs)
+		self._executor = executor
+		self._claims = {} # gizmo -> (thread id, event) of the thread currently computing it
+
+
+	@classmethod
+	def default_executor(cls) -> Executor:
+		"""Returns the thread pool shared by all games without a specific executor."""
+		with cls._shared_executor_lock:
+			if ParallelGame._shared_executor is None:
+				ParallelGame._shared_executor = ThreadPoolExecutor(thread_name_prefix='omniply')
+		return ParallelGame._shared_executor
+
+
+	def grab_from(self, ctx: Optional[AbstractGame], gizmo: str) -> Any:
+		if gizmo in self.data:
+			return super().grab_from(ctx, gizmo)
+		me = threading.get_ident()
+		with self._cache_lock:
+			claim = self._claims.get(gizmo)
+			mine = claim is None and gizmo not in self.data
+			if mine:
+				claim = self._claims[gizmo] = (me, threading.Event())
+		if not mine:
+			if claim is not None and claim[0] != me:
+				claim[1].wait() # another thread is already computing the gizmo
+			return super().grab_from(ctx, gizmo)
+		try:
+			self._fan_out(gizmo)
+			return super().grab_from(ctx, gizmo)
+		finally:
+			with self._cache_lock:
+				del self._claims[gizmo]
+			claim[1].set()
+
+
+	def _fan_out(self, gizmo: str) -> None:
+		"""Grabs all missing parents of the gizmo concurrently."""
+		try:
+			gadget = next(self._gadgets(gizmo), None)
+		except MissingGadget:
+			return
+		if not isinstance(gadget, AbstractGenetic):
+			return
+		parents = list(dict.fromkeys(parent for gene in gadget.genes(gizmo) if gene.parents is not None
+									 for parent in gene.parents if parent not in self.data))
+		if len(parents) < 2:
+			return
+		executor = self._executor or self.default_executor()
+		jobs = [(parent, executor.submit(self._grab_parent, gizmo, parent)) for parent in parents[1:]]
+		self._grab_parent(gizmo, parents[0])
+		for parent, job in jobs:
+			if job.cancel(): # not started yet, so it is faster (and deadlock-free) to grab it here
+				self._grab_parent(gizmo, parent)
+			else:
+				job.result()
+
+
+	def _grab_parent(self, owner: str, parent: str) -> None:
+		tracing, partial_grabs = self._tracing, self._partial_grabs
+		tracing.append(owner)
+		partial_grabs.append(owner) # so the parent is traced as if it was grabbed by the owner
+		try:
+			self.grab(parent)
+		except AbstractGadgetError:
+			pass # the error is raised (again) when the gadget of the owner grabs the parent itself
+		finally:
+			partial_grabs.pop()
+			tracing.pop()
+
+
+
+class _FunctionReference:
+	"""
+	Picklable reference to a module-level function which was decorated (e.g. `@tool`), so the module attribute is
+	the gadget rather than the function itself (which prevents pickling the function directly).
+	"""
+	def __init__(self, module: str, qualname: str):
+		self.module = module
+		self.qualname = qualname
+
+
+	def __call__(self, *args: Any, **kwargs: Any) -> Any:
+		obj = importlib.import_module(self.module)
+		for name in self.qualname.split('.'):
+			obj = getattr(obj, name)
+		return getattr(obj, '_fn', obj)(*args, **kwargs)
+
+
+
+class ProcessGadget(AutoFunctionGadget):
+	"""
+	Mix-in for function gadgets to run the function in an executor (by default a shared process pool), so CPU-heavy
+	pure-Python functions can use multiple cores.
+
+	All parents are grabbed in the calling context as usual, then the function and the parent values are sent to a
+	worker, and the output is returned (and cached) in the calling context. This means the function, the parent
+	values, and the output must be picklable (for methods of a kit, the kit is sent along with the function, so it
+	should be lightweight), and the function should not rely on any global state of the calling process.
+
+	Note that the calling thread is blocked until the worker is done, so to actually use multiple workers, several
+	gizmos (or several contexts) must be grabbed concurrently (e.g. using `ParallelContext` or `grab_many`).
+	"""
+
+	_shared_executors = {}
+	_shared_executors_lock = threading.Lock()
+
+	def __init__(self, *args, executor: Union[str, Executor, None] = None, **kwargs):
+		"""
+		Args:
+			executor (Union[str, Executor, None]): Where to run the function, either `'process'` (shared process
+			pool), `'thread'` (shared thread pool, separate from the one `ParallelGame` resolves parents with), a
+			specific executor, or None (in the calling thread).
+		"""
+		if executor is not None and not isinstance(executor, (str, Executor)):
+			raise TypeError(f'Expected executor to be a str or Executor, got {type(executor)}')
+		if isinstance(executor, str) and executor not in {'process', 'thread'}:
+			raise ValueError(f'Unknown executor: {executor!r} (expected "process" or "thread")')
+		super().__init__(*args, **kwargs)
+		self._executor = executor
+
+
+	@classmethod
+	def shared_executor(cls, kind: str) -> Executor:
+		"""
+		Returns the executor shared by all gadgets (and contexts) with the given kind of executor.
+
+		Args:
+			kind (str): Either `'process'` or `'thread'`.
+
+		Returns:
+			Executor: The shared executor (created on first use).
+		"""
+		with cls._shared_executors_lock:
+			executor = ProcessGadget._shared_executors.get(kind)
+			if executor is None:
+				# (not the pool of `ParallelGame`, since its workers block on these jobs, which would deadlock)
+				executor = ProcessGadget._shared_executors[kind] = \
+					ThreadPoolExecutor(thread_name_prefix='omniply-tool') if kind == 'thread' else ProcessPoolExecutor()
+		return executor
+
+
+	def __getstate__(self):
+		state = super().__getstate__() if hasattr(super(), '__getstate__') else self.__dict__
+		state = state.copy()
+		state['_executor'] = None # (e.g. in worker processes the function is called directly)
+		return state
+
+
+	def _remote_fn(self) -> Callable:
+		"""Returns the function in a form that can be sent to a worker process."""
+		fn = self._fn
+		if inspect.isfunction(fn) and '<locals>' not in fn.__qualname__:
+			obj = sys.modules.get(fn.__module__)
+			for name in fn.__qualname__.split('.'):
+				obj = getattr(obj, name, None)
+			if obj is not fn:
+				return _FunctionReference(fn.__module__, fn.__qualname__)
+		return fn
+
+
+	def _call_fn(self, conditions: dict[str, Any]) -> Any:
+		executor = self._executor
+		if executor is None:
+			return super()._call_fn(conditions)
+		if isinstance(executor, str):
+			executor = self.shared_executor(executor)
+		fn = self._fn if isinstance(executor, ThreadPoolExecutor) else self._remote_fn()
+		return executor.submit(fn, **conditions).result()
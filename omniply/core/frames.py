@@ -0,0 +1,60 @@
+from typing import Any, Optional, Callable
+import threading
+
+
+
+class _Frame(threading.local):
+	def __reduce__(self):
+		return self.__class__, () # the state of ongoing grabs is never pickled
+
+
+_frame_lock = threading.Lock() # (only used to create the frame of each instance)
+
+
+
+class FrameState:
+	"""
+	Descriptor for instance attributes which hold the state of ongoing grabs (e.g. traces or stacks of gadgets).
+
+	Every thread gets its own value (created lazily using `factory`), which is stored in a `threading.local` frame of
+	the instance. This way, concurrent grabs through the same gaggle or game don't interfere with each other.
+	"""
+
+	def __init__(self, factory: Optional[Callable[[], Any]] = None):
+		self._factory = factory
+		self._name = None
+
+
+	def __set_name__(self, owner, name):
+		self._name = name
+
+
+	@staticmethod
+	def _frame(instance) -> threading.local:
+		# (the instance `__dict__` is never accessed directly, since that makes all attribute lookups slower)
+		frame = getattr(instance, '_grab_frame', None)
+		if frame is None:
+			with _frame_lock:
+				frame = getattr(instance, '_grab_frame', None)
+				if frame is None:
+					frame = _Frame()
+					object.__setattr__(instance, '_grab_frame', frame)
+		return frame
+
+
+	def __get__(self, instance, owner):
+		try: # (the frame only contains the values of the current thread)
+			return instance._grab_frame.__dict__[self._name]
+		except (AttributeError, KeyError): # no frame or no value yet (or accessed from the class)
+			if instance is None:
+				return self
+		state = self._frame(instance).__dict__
+		value = state[self._name] = None if self._factory is None else self._factory()
+		return value
+
+
+	def __set__(self, instance, value):
+		self._frame(instance).__dict__[self._name] = value
+
+
+
@@ -1,4 +1,5 @@
 from typing import Optional, Any, Iterator, TypeVar, Generic, Union, Callable, Iterable, Mapping, Sequence
+import weakref
 from itertools import chain
 from collections import OrderedDict
 
@@ -8,6 +9,7 @@ from omnibelt.crafts import InheritableCrafty, AbstractSkill
 from .abstract import AbstractGadget, AbstractGaggle, AbstractGame, AbstractMutable
 from .errors import logger, GadgetFailed, MissingGadget, AssemblyError
 from .gadgets import GadgetBase, SingleGadgetBase, SingleFunctionGadget, AutoSingleFunctionGadget
+from .frames import FrameState
 
 Self = TypeVar('Self')
 
@@ -17,15 +19,17 @@ class GaggleBase(GadgetBase, AbstractGaggle):
 	keep track of all the subgadgets, and consequently implements the expected API for gaggles.
 
 	The gadgets in the table should be in O-N order (reverse order of presidence, so the last gadget in the list for
-	a gizmo is tried first).
+	a gizmo is tried first). To make adding and removing gadgets O(1), the gadgets are stored in insertion-ordered
+	dicts keyed by the identity of the gadget.
 
 	Attributes:
-		_gadgets_table (dict[str, list[AbstractGadget]]): A dictionary where keys are gadget names and values are lists
-		of subgadgets.
+		_gadgets_table (dict[str, dict[int, AbstractGadget]]): A dictionary where keys are gadget names and values are
+		the subgadgets (keyed by `id`).
+		_gadgets_list (dict[int, AbstractGadget]): All subgadgets (keyed by `id`).
 	"""
 
-	_gadgets_table: dict[str, list[AbstractGadget]]
-	_gadgets_list: list[AbstractGadget]
+	_gadgets_table: dict[str, dict[int, AbstractGadget]]
+	_gadgets_list: dict[int, AbstractGadget]
 
 	def __init__(self, *args, **kwargs):
 		"""
@@ -38,7 +42,7 @@ class GaggleBase(GadgetBase, AbstractGaggle):
 		"""
 		super().__init__(*args, **kwargs)
 		self._gadgets_table = {}
-		self._gadgets_list = []
+		self._gadgets_list = {}
 
 	def gizmos(self) -> Iterator[str]:
 		"""
@@ -70,11 +74,11 @@ class GaggleBase(GadgetBase, AbstractGaggle):
 			Iterator[AbstractGadget]: An iterator over the gadgets that can produce the given gizmo.
 		"""
 		if gizmo is None:
-			yield from reversed(self._gadgets_list)
+			yield from reversed(self._gadgets_list.values())
 		else:
 			if gizmo not in self._gadgets_table:
 				raise self._MissingGadgetError(gizmo)
-			yield from reversed(self._gadgets_table[gizmo])
+			yield from reversed(self._gadgets_table[gizmo].values())
 
 
 	def _gadgets(self, gizmo: Optional[str] = None) -> Iterator[AbstractGadget]:
@@ -165,22 +169,10 @@ class LoopyGaggle(GaggleBase):
 
 	Attributes:
 		_grabber_stack (dict[str, Iterator[AbstractGadget]]): A dictionary keeping track of which subgadgets are still
-		available to use for each gizmo.
+		available to use for each gizmo (separately for each thread).
 	"""
-	_grabber_stack: dict[str, Iterator[AbstractGadget]]
-	_grab_query: Optional[str]
-
-	def __init__(self, *args, **kwargs):
-		"""
-		Initializes a new instance of the LoopyGaggle class.
-
-		Args:
-			args: unused, passed to super.
-			kwargs: unused, passed to super.
-		"""
-		super().__init__(*args, **kwargs)
-		self._grabber_stack = {}
-		self._grab_query = None
+	_grabber_stack: dict[str, Iterator[AbstractGadget]] = FrameState(dict)
+	_grab_query: Optional[str] = FrameState()
 
 	def grab_from(self, ctx: 'AbstractGame', gizmo: str) -> Any:
 		"""
@@ -223,8 +215,151 @@ class LoopyGaggle(GaggleBase):
 class MutableGaggle(GaggleBase, AbstractMutable):
 	"""
 	The MutableGaggle class is a mix-in for custom gaggles to dynamically add and remove subgadgets.
+
+	To avoid walking through all nested gaggles for every grab, the flattened gadgets for each gizmo are memoized.
+	Any change to the vendors (of this gaggle or of any included mutable gaggle) bumps the `_vendor_version` and
+	invalidates the memo.
+
+	Forks (see `_share_vendors`) share the gadget tables with their source until either one is modified
+	(copy-on-write).
+
+	Attributes:
+		_vendor_version (int): Counter which is incremented whenever the vendors of this gaggle change.
+		_vendor_index (dict[str, tuple[AbstractGadget]]): Memoized flattened gadgets for each gizmo (in order of
+		precedence).
+		_vendor_watchers (dict[int, weakref.ref]): Gaggles which include this gaggle and must be notified of changes.
+		_vendor_gaggles (dict[int, MutableGaggle]): Included mutable gaggles which this gaggle watches.
+		_vendors_shared (bool): True if the gadget tables may be shared with another gaggle.
 	"""
 
+	_vendor_version: int = 0
+	_vendors_shared: bool = False
+
+	def __init__(self, *args, **kwargs):
+		self._vendor_index = {}
+		self._vendor_watchers = {}
+		self._vendor_gaggles = {}
+		super().__init__(*args, **kwargs)
+
+
+	def __getstate__(self):
+		state = super().__getstate__() if hasattr(super(), '__getstate__') else self.__dict__
+		state = state.copy()
+		# watchers are weak references to other gaggles (which may not be pickled), the memo is simply rebuilt
+		state['_vendor_watchers'] = {}
+		state['_vendor_index'] = {}
+		return state
+
+
+	def __setstate__(self, state):
+		if hasattr(super(), '__setstate__'):
+			super().__setstate__(state)
+		else:
+			self.__dict__.update(state)
+		# included gaggles are keyed by id, which changes when unpickling
+		included = self._vendor_gaggles
+		self._vendor_gaggles = {}
+		self._watch_vendors(included.values())
+
+
+	def _vendors_changed(self) -> None:
+		"""
+		Invalidates the memoized gadgets of this gaggle and of all gaggles that include it.
+		"""
+		self._vendor_version += 1
+		self._vendor_index.clear()
+		for key, ref in list(self._vendor_watchers.items()):
+			watcher = ref()
+			if watcher is None:
+				del self._vendor_watchers[key]
+			else:
+				watcher._vendors_changed()
+
+
+	def _gadgets(self, gizmo: Optional[str] = None) -> Iterator[AbstractGadget]:
+		"""
+		Returns all known subgadgets that can produce the given gizmo using the memoized flattened gadgets.
+
+		Args:
+			gizmo (Optional[str]): The name of the gizmo to check. If not provided, all gadgets are returned.
+
+		Returns:
+			Iterator[AbstractGadget]: An iterator over the gadgets that can produce the given gizmo.
+		"""
+		if gizmo is None:
+			yield from super()._gadgets(gizmo)
+			return
+		flat = self._vendor_index.get(gizmo)
+		if flat is None:
+			flat = tuple(super()._gadgets(gizmo))
+			self._vendor_index[gizmo] = flat
+		yield from flat
+
+
+	def _watch_vendors(self, gadgets: Iterable[AbstractGadget], watch: bool = True) -> None:
+		for gadget in gadgets:
+			if isinstance(gadget, MutableGaggle) and not isinstance(gadget, MultiGadgetBase):
+				if watch:
+					gadget._vendor_watchers[id(self)] = weakref.ref(self)
+					self._vendor_gaggles[id(gadget)] = gadget
+				else:
+					gadget._vendor_watchers.pop(id(self), None)
+					self._vendor_gaggles.pop(id(gadget), None)
+
+
+	def _own_vendors(self) -> None:
+		"""
+		Copies the gadget tables if they are shared with another gaggle, so that they can be safely modified.
+		"""
+		if self._vendors_shared:
+			self._gadgets_table = {gizmo: table.copy() for gizmo, table in self._gadgets_table.items()}
+			self._gadgets_list = self._gadgets_list.copy()
+			self._vendor_gaggles = self._vendor_gaggles.copy()
+			self._vendor_index = {}
+			self._vendors_shared = False
+
+
+	def _share_vendors(self: Self, source: 'MutableGaggle', *, skip: Iterable[AbstractGadget] = ()) -> Self:
+		"""
+		Adds all vendors of `source` (except those in `skip`) with higher precedence than any current vendors,
+		which is equivalent to `self.extend(source.vendors())` without having to process each gadget again.
+
+		If this gaggle doesn't have any vendors yet, the gadget tables are shared with `source` until either gaggle
+		is modified (copy-on-write), so forking is O(1).
+
+		Args:
+			source (MutableGaggle): The gaggle whose vendors should be added.
+			skip (Iterable[AbstractGadget]): Vendors of `source` which should not be added.
+
+		Returns:
+			Self: this gaggle.
+		"""
+		skip = {id(gadget) for gadget in skip}
+		if not len(self._gadgets_list) and not len(skip):
+			self._vendors_changed()
+			self._gadgets_table = source._gadgets_table
+			self._gadgets_list = source._gadgets_list
+			self._vendor_gaggles = source._vendor_gaggles
+			self._vendor_index = source._vendor_index
+			self._vendors_shared = source._vendors_shared = True
+		else:
+			self._own_vendors()
+			theirs = {key: gadget for key, gadget in source._gadgets_list.items() if key not in skip}
+			self._gadgets_list = {**{key: gadget for key, gadget in self._gadgets_list.items() if key not in theirs},
+								  **theirs}
+			for gizmo, table in source._gadgets_table.items():
+				theirs = {key: gadget for key, gadget in table.items() if key not in skip}
+				mine = self._gadgets_table.get(gizmo, {})
+				self._gadgets_table[gizmo] = {**{key: gadget for key, gadget in mine.items() if key not in theirs},
+											  **theirs}
+			self._vendor_gaggles.update((key, gaggle) for key, gaggle in source._vendor_gaggles.items()
+										if key not in skip)
+			self._vendors_changed()
+		for gaggle in self._vendor_gaggles.values():
+			gaggle._vendor_watchers[id(self)] = weakref.ref(self)
+		return self
+
+
 	def extend(self: Self, gadgets: Iterable[AbstractGadget]) -> Self:
 		"""
 		Adds given gadgets in the iterator in the order that is given, which means subsequent `grab` would use the
@@ -243,17 +378,22 @@ class MutableGaggle(GaggleBase, AbstractMutable):
 			_eager = True
 		if _eager:
 			gadgets = tuple(gadgets)
-		self._gadgets_list.extend(reversed(gadgets))
+		self._own_vendors()
+		for gadget in reversed(gadgets):
+			# re-added gadgets are moved to the front (i.e. highest precedence)
+			self._gadgets_list.pop(id(gadget), None)
+			self._gadgets_list[id(gadget)] = gadget
 		new = {}
 		for gadget in gadgets:
 			for gizmo in gadget.gizmos():
 				new.setdefault(gizmo, []).append(gadget)
 		for gizmo, group in new.items():
-			if gizmo in self._gadgets_table:
-				for gadget in group:
-					if gadget in self._gadgets_table[gizmo]:
-						self._gadgets_table[gizmo].remove(gadget)
-			self._gadgets_table.setdefault(gizmo, []).extend(reversed(group))
+			table = self._gadgets_table.setdefault(gizmo, {})
+			for gadget in reversed(group):
+				table.pop(id(gadget), None)
+				table[id(gadget)] = gadget
+		self._watch_vendors(gadgets)
+		self._vendors_changed()
 		return self
 
 	def exclude(self: Self, *gadgets: AbstractGadget) -> Self:
@@ -266,19 +406,23 @@ class MutableGaggle(GaggleBase, AbstractMutable):
 		Returns:
 			Self: this gaggle.
 		"""
+		self._own_vendors()
 		for gadget in gadgets:
 			for gizmo in gadget.gizmos():
-				if gizmo in self._gadgets_table and gadget in self._gadgets_table[gizmo]:
-					self._gadgets_table[gizmo].remove(gadget)
-			if gadget in self._gadgets_list:
-				self._gadgets_list.remove(gadget)
+				if gizmo in self._gadgets_table:
+					self._gadgets_table[gizmo].pop(id(gadget), None)
+			self._gadgets_list.pop(id(gadget), None)
+		self._watch_vendors(gadgets, watch=False)
+		self._vendors_changed()
 		return self
 
 
 	def _reset_vendors(self):
-		vendors = self._gadgets_list.copy()
+		self._own_vendors()
+		vendors = list(self._gadgets_list.values())
 		self._gadgets_list.clear()
 		self._gadgets_table.clear()
+		self._vendors_changed()
 		self.extend(reversed(vendors))
 
 
@@ -315,9 +459,9 @@ class CraftyGaggle(GaggleBase, InheritableCrafty):
 
 	def _process_skill(self, skill: AbstractSkill):
 		if isinstance(skill, AbstractGadget):
-			self._gadgets_list.append(skill)
+			self._gadgets_list[id(skill)] = skill
 			for gizmo in skill.gizmos():
-				self._gadgets_table.setdefault(gizmo, []).append(skill)
+				self._gadgets_table.setdefault(gizmo, {})[id(skill)] = skill
 
 
 
@@ -0,0 +1,185 @@
+from typing import Any, Optional, Iterator, Iterable, Tuple, Dict
+
+from .abstract import AbstractGadget, AbstractGame, AbstractGadgetError, AbstractConsistentGame
+from .gaggles import GaggleBase
+from .games import CacheGame, TraceGame
+from .genetics import AbstractGenetic, GeneticGaggle
+
+
+
+class GamePlan:
+	"""
+	A GamePlan is a flat, topologically ordered schedule of (gizmo, gadget) steps which produces the `targets` given
+	the `given` gizmos. The gadget choice for every gizmo is resolved once (when compiling), so executing the plan
+	does not have to search through any gaggles.
+
+	If a step fails at runtime, the gizmo is grabbed the usual way (`ctx.grab`), so the semantics of the game are
+	preserved.
+
+	Attributes:
+		targets (tuple[str]): The gizmos produced by this plan.
+		given (tuple[str]): The gizmos which are expected to be provided when executing the plan.
+		steps (tuple[tuple[str, AbstractGadget]]): The gadgets to call (and the gizmo they produce) in order.
+	"""
+
+	def __init__(self, targets: Iterable[str], given: Iterable[str], steps: Iterable[Tuple[str, AbstractGadget]],
+				 **kwargs):
+		super().__init__(**kwargs)
+		self.targets = tuple(targets)
+		self.given = tuple(given)
+		self.steps = tuple(steps)
+
+
+	def __repr__(self):
+		return f'{self.__class__.__name__}({", ".join(self.given)} -> {", ".join(self.targets)}: {len(self)} steps)'
+
+
+	def __len__(self):
+		return len(self.steps)
+
+
+	def __iter__(self) -> Iterator[Tuple[str, AbstractGadget]]:
+		yield from self.steps
+
+
+	@staticmethod
+	def _is_cached(ctx: AbstractGame, gizmo: str) -> bool:
+		is_cached = getattr(ctx, 'is_cached', None)
+		return is_cached is not None and is_cached(gizmo)
+
+
+	@staticmethod
+	def _grab_step(ctx: AbstractGame, gadget: AbstractGadget, gizmo: str) -> Any:
+		'''calls the gadget as if `gizmo` was grabbed from `ctx` (so its parents are traced as usual)'''
+		if not isinstance(ctx, TraceGame):
+			return gadget.grab_from(ctx, gizmo)
+		tracing, partial_grabs = ctx._tracing, ctx._partial_grabs
+		tracing.append(gizmo)
+		partial_grabs.append(gizmo)
+		try:
+			return gadget.grab_from(ctx, gizmo)
+		finally:
+			partial_grabs.pop()
+			tracing.pop()
+
+
+	def execute(self, ctx: AbstractGame, **given: Any) -> Dict[str, Any]:
+		"""
+		Runs all steps of the plan against `ctx` (caching every intermediate gizmo in `ctx`).
+
+		Args:
+			ctx (AbstractGame): The game to use (should usually be a fresh context including the same gadgets that
+			were used to compile the plan).
+			given: Any values for the given gizmos, which are added to the cache of `ctx` before executing.
+
+		Returns:
+			dict[str, Any]: The values of all targets.
+		"""
+		for gizmo, val in given.items():
+			ctx[gizmo] = val
+		for gizmo, gadget in self.steps:
+			if self._is_cached(ctx, gizmo):
+				continue
+			try:
+				val = self._grab_step(ctx, gadget, gizmo)
+			except AbstractGadgetError:
+				# fall back to the full inference engine
+				ctx.grab(gizmo)
+				continue
+			ctx[gizmo] = val
+			produced = {gizmo: val}
+			if isinstance(ctx, AbstractConsistentGame):
+				# multi-output gadgets produce all their siblings at once
+				for sibling, sibling_val in ctx.check_gadget_cache(gadget).items():
+					if sibling != gizmo and not self._is_cached(ctx, sibling):
+						ctx[sibling] = sibling_val
+						produced[sibling] = sibling_val
+						if isinstance(ctx, TraceGame) and isinstance(gadget, AbstractGenetic):
+							# (the parents were only traced for `gizmo`)
+							for gene in gadget.genes(sibling):
+								for parent in gene.parents or ():
+									ctx._products.setdefault(parent, set()).add(sibling)
+			if isinstance(ctx, CacheGame):
+				for key, key_val in produced.items():
+					ctx._admit_cache(key, key_val)
+		return {gizmo: ctx.grab(gizmo) for gizmo in self.targets}
+
+
+
+class CompilableGaggle(GeneticGaggle):
+	"""
+	Mix-in for gaggles to compile a `GamePlan` for a fixed set of targets using the parents of each gene.
+	"""
+
+	_GamePlan = GamePlan
+
+	def _resolve_parents(self, gadget: AbstractGadget, gizmo: str) -> Tuple[str, ...]:
+		"""
+		Returns the (statically known) parents of `gadget` to produce `gizmo`. Gadgets that are not genetic are
+		treated as having no known parents (so any inputs they need are grabbed lazily).
+		"""
+		if isinstance(gadget, AbstractGenetic):
+			for gene in gadget.genes(gizmo):
+				if gene.parents is not None:
+					return tuple(gene.parents)
+				break
+		return ()
+
+
+	def compile(self, *targets: str, given: Iterable[str] = ()) -> GamePlan:
+		"""
+		Resolves which gadget will be used for every gizmo that is needed to produce the `targets` and returns a
+		flat, topologically ordered schedule of those gadgets.
+
+		For each gizmo, the first gadget (in order of precedence) for which all parents can be resolved is selected.
+		If no gadget qualifies, the first gadget is used and any unresolvable parents are left to the gadget itself
+		(e.g. if it has a default value).
+
+		Args:
+			targets (str): The gizmos that should be produced.
+			given (Iterable[str]): The gizmos which will be provided (e.g. cached) when executing the plan.
+
+		Returns:
+			GamePlan: The compiled plan.
+
+		Raises:
+			MissingGadgetError: If no gadget can produce one of the targets.
+		"""
+		given = tuple(given)
+		resolved = set(given)
+		steps = []
+		active = set()
+
+		def _resolve(gizmo: str) -> bool:
+			if gizmo in resolved:
+				return True
+			if gizmo in active:
+				return False
+			if not self.gives(gizmo):
+				return False
+			active.add(gizmo)
+			try:
+				candidates = list(self._gadgets(gizmo))
+				for gadget in candidates:
+					num_steps, known = len(steps), resolved.copy()
+					if all(_resolve(parent) for parent in self._resolve_parents(gadget, gizmo)):
+						break
+					del steps[num_steps:]
+					resolved.intersection_update(known)
+				else:
+					if not len(candidates):
+						return False
+					gadget = candidates[0]
+					for parent in self._resolve_parents(gadget, gizmo):
+						_resolve(parent)
+			finally:
+				active.discard(gizmo)
+			steps.append((gizmo, gadget))
+			resolved.add(gizmo)
+			return True
+
+		for target in targets:
+			if not _resolve(target) and target not in resolved:
+				raise self._MissingGadgetError(target)
+		return self._GamePlan(targets, given, steps)
+
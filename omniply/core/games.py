@@ -7,6 +7,9 @@ from .abstract import (AbstractGadget, AbstractGaggle, AbstractGame, AbstractGan
 from .errors import GadgetFailed, MissingGadget, AssemblyError, GrabError
 from .gadgets import GadgetBase
 from .gaggles import GaggleBase, MutableGaggle, MultiGadgetBase
+from .garbage import AbstractCachePolicy
+from .frames import FrameState
+import threading
 
 Self = TypeVar('Self')
 
@@ -90,12 +93,44 @@ class CacheGame(GameBase, UserDict):
 	"""
 	The CacheGame class is a subclass of GameBase and UserDict. It provides methods to handle gizmo caching.
 
+	Optionally, a cache policy can be provided to bound the size of the cache. Only gizmos that were computed by the
+	game (rather than set manually) are tracked by the policy, so any evicted gizmo is simply recomputed the next time
+	it is grabbed.
+
 	Attributes:
 		_gizmo_type (Optional[type]): The type of the gizmo. Defaults to None.
+		_cache_policy (Optional[AbstractCachePolicy]): Decides which computed gizmos to evict (if any).
 	"""
 
 	_gizmo_type = None
 
+	def __init__(self, *args, cache_policy: Optional[AbstractCachePolicy] = None, **kwargs):
+		"""
+		Initializes a new instance of the CacheGame class.
+
+		Args:
+			args: Variable length argument list.
+			cache_policy (Optional[AbstractCachePolicy]): Policy to bound the size of the cache. Defaults to None
+			(unbounded).
+			kwargs: Arbitrary keyword arguments.
+		"""
+		self._cache_policy = cache_policy
+		self._cache_lock = threading.RLock()
+		super().__init__(*args, **kwargs) # (may already cache items)
+
+	def __getstate__(self):
+		state = super().__getstate__() if hasattr(super(), '__getstate__') else self.__dict__
+		state = state.copy()
+		del state['_cache_lock'] # locks can't be pickled
+		return state
+
+	def __setstate__(self, state):
+		if hasattr(super(), '__setstate__'):
+			super().__setstate__(state)
+		else:
+			self.__dict__.update(state)
+		self._cache_lock = threading.RLock()
+
 	def __setitem__(self, key, value):
 		"""
 		Sets an item in the dictionary.
@@ -106,7 +141,8 @@ class CacheGame(GameBase, UserDict):
 		"""
 		if self._gizmo_type is not None:
 			key = self._gizmo_type(key)
-		self.set_cache(key, value)
+		with self._cache_lock:
+			self.set_cache(key, value)
 
 	def set_cache(self, gizmo: str, val: Any):
 		"""
@@ -116,9 +152,70 @@ class CacheGame(GameBase, UserDict):
 			gizmo (str): The name of the gizmo to add.
 			val (Any): The value of the gizmo to add.
 		"""
-		self.data[gizmo] = val
+		with self._cache_lock:
+			self.data[gizmo] = val
+			if self._cache_policy is not None:
+				# manually set gizmos are never evicted (this is undone by `_admit_cache` for computed gizmos)
+				self._cache_policy.discard(gizmo)
 		return self
 
+	def _uncache(self, gizmo: str) -> None:
+		"""
+		Removes a gizmo from the cache (if it is cached).
+
+		Args:
+			gizmo (str): The name of the gizmo to remove.
+		"""
+		with self._cache_lock:
+			self.data.pop(gizmo, None)
+			if self._cache_policy is not None:
+				self._cache_policy.discard(gizmo)
+
+	def _admit_cache(self, key: Any, val: Any) -> None:
+		"""
+		Registers a newly computed value with the cache policy (if any) and evicts whatever the policy selects.
+
+		Args:
+			key (Any): The key of the computed value (usually the gizmo).
+			val (Any): The computed value.
+		"""
+		policy = self._cache_policy
+		if policy is not None:
+			with self._cache_lock:
+				policy.admit(key, val)
+				for victim in policy.victims():
+					self._evict(victim)
+
+	def _cache_hit(self, key: Any) -> None:
+		"""
+		Registers the use of a cached value with the cache policy (if any).
+
+		Args:
+			key (Any): The key of the cached value (usually the gizmo).
+		"""
+		if self._cache_policy is not None:
+			with self._cache_lock:
+				self._cache_policy.hit(key)
+
+	def _evict(self, key: Any) -> None:
+		"""
+		Evicts a computed value from the cache (it is no longer tracked by the cache policy at this point).
+
+		Args:
+			key (Any): The key of the value to evict.
+		"""
+		self.data.pop(key, None)
+
+	def cache_stats(self) -> Optional[dict[str, int]]:
+		"""
+		Returns the counters (e.g. hits, misses, evictions) of the cache policy.
+
+		Returns:
+			Optional[dict[str, int]]: The counters or None if there is no cache policy.
+		"""
+		if self._cache_policy is not None:
+			return self._cache_policy.stats()
+
 	def __repr__(self):
 		"""
 		Returns a string representation of the CacheGame instance.
@@ -164,7 +261,11 @@ class CacheGame(GameBase, UserDict):
 		"""
 		Clears the cache.
 		"""
-		self.data.clear()
+		with self._cache_lock:
+			if self._cache_policy is not None:
+				for gizmo in self.data:
+					self._cache_policy.discard(gizmo)
+			self.data.clear()
 		return self
 
 	def _cache_miss(self, ctx: Optional[AbstractGame], gizmo: str) -> Any:
@@ -191,9 +292,12 @@ class CacheGame(GameBase, UserDict):
 			Any: The grabbed gizmo.
 		"""
 		if gizmo in self.data:
+			if self._cache_policy is not None:
+				self._cache_hit(gizmo)
 			return self.data[gizmo]
 		val = self._cache_miss(ctx, gizmo)
 		self[gizmo] = val  # cache packaged val
+		self._admit_cache(gizmo, val)
 		return val
 
 
@@ -201,6 +305,8 @@ class GatedCache(CacheGame): # TODO: rename to GangCache
 	"""
 	The GatedCache class is a subclass of CacheGame. It provides methods to handle gizmo caching with support for gates.
 
+	If there is a cache policy, the values in the gate caches are tracked using the key `(gate, gizmo)`.
+
 	Attributes:
 		_gate_cache (dict): A dictionary to store gate caches.
 	"""
@@ -263,7 +369,10 @@ class GatedCache(CacheGame): # TODO: rename to GangCache
 		Returns:
 			Any: The cached value of the gizmo in the gate cache.
 		"""
-		return self._gate_cache[gate][gizmo]
+		val = self._gate_cache[gate][gizmo]
+		if self._cache_policy is not None:
+			self._cache_hit((gate, gizmo))
+		return val
 
 	def update_gate_cache(self, gate: AbstractGang, gizmo: str, val: Any):
 		"""
@@ -276,7 +385,20 @@ class GatedCache(CacheGame): # TODO: rename to GangCache
 		"""
 		if self._gizmo_type is not None:
 			gizmo = self._gizmo_type(gizmo)
-		self._gate_cache.setdefault(gate, {})[gizmo] = val
+		with self._cache_lock:
+			self._gate_cache.setdefault(gate, {})[gizmo] = val
+		self._admit_cache((gate, gizmo), val)
+
+	def _evict(self, key: Any) -> None:
+		if isinstance(key, tuple):
+			gate, gizmo = key
+			cache = self._gate_cache.get(gate)
+			if cache is not None:
+				cache.pop(gizmo, None)
+				if not len(cache):
+					del self._gate_cache[gate]
+		else:
+			super()._evict(key)
 
 	def clear_cache(self, *, clear_gate_caches=True, **kwargs) -> None:
 		"""
@@ -287,7 +409,12 @@ class GatedCache(CacheGame): # TODO: rename to GangCache
 		"""
 		super().clear_cache(**kwargs)
 		if clear_gate_caches:
-			self._gate_cache.clear()
+			with self._cache_lock:
+				if self._cache_policy is not None:
+					for gate, cache in self._gate_cache.items():
+						for gizmo in cache:
+							self._cache_policy.discard((gate, gizmo))
+				self._gate_cache.clear()
 
 
 
@@ -295,15 +422,17 @@ class TraceGame(CacheGame):
 	"""
 	The TraceGame class is a subclass of CacheGame. It provides methods to handle gizmo caching with trace support.
 	"""
+	_partial_grabs = FrameState(list) # gizmos currently being computed (separately for each thread)
+
 	def __init__(self, *args, **kwargs):
 		super().__init__(*args, **kwargs)
 		self._history = {} # gizmo -> list of gizmos that were created as a result
 		self._products = {} # gizmo -> list of gizmos that used it
-		self._partial_grabs = []
+		self._tracing = [] # gizmos currently being computed by any thread (to skip the thread-local state if empty)
 
 	def undo(self, gizmo: str):
 		'''removed any cached gizmos that were automatically grabbed during the creation of the given gizmo'''
-		self.data.pop(gizmo, None)
+		self._uncache(gizmo)
 		for dep in self._history.pop(gizmo, []):
 			# self.data.pop(dep, None)
 			self.undo(dep)
@@ -311,27 +440,33 @@ class TraceGame(CacheGame):
 
 	def purge(self, gizmo: str):
 		'''remove any cached gizmo that depends on the given gizmo'''
-		self.data.pop(gizmo, None)
+		self._uncache(gizmo)
 		for dep in self._products.pop(gizmo, []):
 			# self.data.pop(dep, None)
 			self.purge(dep)
 		return self
 
 	def _cache_miss(self, ctx: Optional[AbstractGame], gizmo: str) -> Any:
-		self._partial_grabs.append(gizmo)
+		tracing, partial_grabs = self._tracing, self._partial_grabs
+		tracing.append(gizmo)
+		partial_grabs.append(gizmo)
 		try:
 			val = super()._cache_miss(ctx, gizmo)
 		finally:
-			self._partial_grabs.pop()
+			partial_grabs.pop()
+			tracing.pop()
 
-		if len(self._partial_grabs):
-			self._history.setdefault(self._partial_grabs[-1], set()).add(gizmo)
+		if len(partial_grabs):
+			self._history.setdefault(partial_grabs[-1], set()).add(gizmo)
 		return val
 
 	def grab_from(self, ctx: Optional[AbstractGame], gizmo: str) -> Any:
+		if not self._tracing: # nothing is being computed, so there is nothing to trace (e.g. most cache hits)
+			return super().grab_from(ctx, gizmo)
 		val = super().grab_from(ctx, gizmo)
-		if len(self._partial_grabs):
-			self._products.setdefault(gizmo, set()).add(self._partial_grabs[-1])
+		partial_grabs = self._partial_grabs
+		if len(partial_grabs):
+			self._products.setdefault(gizmo, set()).add(partial_grabs[-1])
 		return val
 
 
@@ -339,27 +474,33 @@ class TraceGame(CacheGame):
 class RollingGame(TraceGame, MutableGaggle):
 	def __init__(self, *args, **kwargs):
 		super().__init__(*args, **kwargs)
-		self._rolling_stock = {} # gizmo -> list of gadgets that were included during the gizmos creation
+		self._rolling_stock = {} # gizmo -> gadgets (by id) that were included during the gizmos creation
+		self._rolling_owners = {} # id(gadget) -> gizmos whose rolling stock contains the gadget
 
 
 	def rollback(self, gizmo: str):
 		'''remove any cached gizmo that depends on the given gizmo'''
-		self.exclude(*self._rolling_stock.pop(gizmo, []))
+		self.exclude(*self._rolling_stock.pop(gizmo, {}).values())
 		self.undo(gizmo)
 		return self
 
 
 	def extend(self: Self, gadgets: Iterable[AbstractGadget]) -> Self:
 		if len(self._partial_grabs):
-			self._rolling_stock.setdefault(self._partial_grabs[-1], []).extend(gadgets)
+			gadgets = tuple(gadgets)
+			owner = self._partial_grabs[-1]
+			stock = self._rolling_stock.setdefault(owner, {})
+			for gadget in gadgets:
+				stock[id(gadget)] = gadget
+				self._rolling_owners.setdefault(id(gadget), set()).add(owner)
 		return super().extend(gadgets)
 
 
 	def exclude(self: Self, *gadgets: AbstractGadget) -> Self:
-		for known in self._rolling_stock.values():
-			for gadget in gadgets:
-				if gadget in known:
-					known.remove(gadget)
+		for gadget in gadgets:
+			for owner in self._rolling_owners.pop(id(gadget), ()):
+				if owner in self._rolling_stock:
+					self._rolling_stock[owner].pop(id(gadget), None)
 		return super().exclude(*gadgets)
 
 
@@ -377,6 +518,12 @@ class ConsistentGame(TraceGame, AbstractConsistentGame):
 			self._gadget_precomputes.clear()
 		return self
 
+	def _evict(self, key: Any) -> None:
+		super()._evict(key)
+		# drop any precomputed outputs including the evicted gizmo (they will be recomputed together if necessary)
+		for gadget in [gadget for gadget, cache in self._gadget_precomputes.items() if key in cache]:
+			del self._gadget_precomputes[gadget]
+
 	def set_cache(self, gizmo: str, val: Any):
 		if gizmo in self.data:# and val != self.data[gizmo]:
 			self.purge(gizmo)
@@ -4,6 +4,7 @@ from .abstract import AbstractGang, AbstractGame, AbstractGadget
 from .gadgets import GadgetBase
 from .gaggles import MultiGadgetBase
 from .games import GatedCache, CacheGame
+from .frames import FrameState
 
 
 
@@ -62,6 +63,8 @@ class GangBase(MultiGadgetBase, GadgetBase, AbstractGang):
 
 
 class MechanismBase(GangBase):
+	_gang_stack = FrameState(list) # of external contexts (separately for each thread)
+
 	def __init__(self, external: Mapping[str, str] = None, internal: Mapping[str, str] = None, *,
 				 exclusive: bool = True, insulated: bool = True, **kwargs):
 		"""
@@ -84,7 +87,6 @@ class MechanismBase(GangBase):
 		if len(self._reverse_external_map) != len(external):
 			print(f'WARNING: duplicate external gizmos: {external}')
 		self._internal_map = internal
-		self._gang_stack = [] # of external contexts
 		self._exclusive = exclusive
 		self._insulated = insulated
 
@@ -0,0 +1,182 @@
+from typing import Any, Optional, Iterator, Callable, Hashable, Dict
+import sys
+
+
+
+class AbstractCachePolicy:
+	"""
+	Cache policies keep track of the gizmos cached by a game (which could be recomputed) and decide which ones to
+	evict once the cache exceeds its budget.
+	"""
+
+	def hit(self, key: Hashable) -> None:
+		"""Called whenever a cached value is used."""
+		raise NotImplementedError
+
+	def admit(self, key: Hashable, value: Any) -> None:
+		"""Starts tracking a newly computed (and cached) value, which may be evicted later."""
+		raise NotImplementedError
+
+	def discard(self, key: Hashable) -> None:
+		"""Stops tracking a value (e.g. because it was removed or overwritten manually)."""
+		raise NotImplementedError
+
+	def victims(self) -> Iterator[Hashable]:
+		"""Yields the keys which should be evicted (and stops tracking them) until the cache is within budget."""
+		raise NotImplementedError
+
+	def clear(self) -> None:
+		"""Stops tracking all values (counters are kept)."""
+		raise NotImplementedError
+
+	def stats(self) -> Dict[str, int]:
+		"""Returns the counters of the policy."""
+		raise NotImplementedError
+
+
+
+class CachePolicyBase(AbstractCachePolicy):
+	"""
+	Base class for cache policies with an (optional) budget for the number of cached values and/or their total size
+	in bytes. The size of each value is estimated by `size_estimator` (if provided) or `estimate_size`.
+
+	Which value is evicted first is decided by `_victim()`, which must be implemented by subclasses.
+
+	Attributes:
+		max_items (Optional[int]): Maximum number of tracked values.
+		max_bytes (Optional[int]): Maximum total (estimated) size of tracked values.
+		total_bytes (int): Current total (estimated) size of tracked values.
+		hits (int): Number of times a cached value was used.
+		misses (int): Number of times a value had to be computed.
+		evictions (int): Number of evicted values.
+	"""
+
+	def __init__(self, *, max_items: Optional[int] = None, max_bytes: Optional[int] = None,
+				 size_estimator: Optional[Callable[[Any], int]] = None, **kwargs):
+		assert max_items is None or max_items >= 0, 'max_items must be non-negative'
+		assert max_bytes is None or max_bytes >= 0, 'max_bytes must be non-negative'
+		super().__init__(**kwargs)
+		self.max_items = max_items
+		self.max_bytes = max_bytes
+		self._size_estimator = size_estimator
+		self._sizes = {} # key -> estimated size (in order of admission)
+		self.total_bytes = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+
+	def __len__(self):
+		return len(self._sizes)
+
+
+	def __contains__(self, key: Hashable) -> bool:
+		return key in self._sizes
+
+
+	@staticmethod
+	def estimate_size(value: Any) -> int:
+		"""
+		Estimates the size of a value in bytes (uses `nbytes` for arrays and tensors).
+
+		Args:
+			value (Any): The value to estimate.
+
+		Returns:
+			int: The estimated size in bytes.
+		"""
+		nbytes = getattr(value, 'nbytes', None)
+		if isinstance(nbytes, int):
+			return nbytes
+		return sys.getsizeof(value)
+
+
+	def hit(self, key: Hashable) -> None:
+		self.hits += 1
+		if key in self._sizes:
+			self._touch(key)
+
+	def admit(self, key: Hashable, value: Any) -> None:
+		self.misses += 1
+		self.discard(key)
+		size = self.estimate_size(value) if self._size_estimator is None else self._size_estimator(value)
+		self._sizes[key] = size
+		self.total_bytes += size
+
+	def discard(self, key: Hashable) -> None:
+		size = self._sizes.pop(key, None)
+		if size is not None:
+			self.total_bytes -= size
+			self._forget(key)
+
+	def over_budget(self) -> bool:
+		return ((self.max_items is not None and len(self._sizes) > self.max_items)
+				or (self.max_bytes is not None and self.total_bytes > self.max_bytes))
+
+	def victims(self) -> Iterator[Hashable]:
+		while len(self._sizes) and self.over_budget():
+			key = self._victim()
+			self.discard(key)
+			self.evictions += 1
+			yield key
+
+	def clear(self) -> None:
+		for key in list(self._sizes):
+			self.discard(key)
+
+	def stats(self) -> Dict[str, int]:
+		return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+				'items': len(self._sizes), 'bytes': self.total_bytes}
+
+
+	def _touch(self, key: Hashable) -> None:
+		"""Updates the usage information of a tracked value which was just used."""
+		pass
+
+	def _forget(self, key: Hashable) -> None:
+		"""Removes any usage information of a value which is no longer tracked."""
+		pass
+
+	def _victim(self) -> Hashable:
+		"""Returns the tracked key which should be evicted next."""
+		raise NotImplementedError
+
+
+
+class LRUCachePolicy(CachePolicyBase):
+	"""Evicts the least recently used value first."""
+
+	def _touch(self, key: Hashable) -> None:
+		# dicts are ordered, so re-inserting moves the key to the end (most recently used)
+		self._sizes[key] = self._sizes.pop(key)
+
+	def _victim(self) -> Hashable:
+		return next(iter(self._sizes))
+
+
+
+class LFUCachePolicy(CachePolicyBase):
+	"""
+	Evicts the least frequently used value first (ties are broken by evicting the oldest value). The most recently
+	admitted value is only evicted if it is the only one left (otherwise it would never get a chance to be used).
+	"""
+
+	def __init__(self, **kwargs):
+		super().__init__(**kwargs)
+		self._uses = {}
+
+	def admit(self, key: Hashable, value: Any) -> None:
+		super().admit(key, value)
+		self._uses[key] = 0
+
+	def _touch(self, key: Hashable) -> None:
+		self._uses[key] += 1
+
+	def _forget(self, key: Hashable) -> None:
+		self._uses.pop(key, None)
+
+	def _victim(self) -> Hashable:
+		newest = next(reversed(self._uses))
+		return min((key for key in self._uses if key != newest), key=self._uses.get, default=newest)
+
+
@@ -1,11 +1,13 @@
 from typing import Iterator, Callable, Optional, Any, Iterable, Tuple
 import inspect
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from functools import cache, cached_property
 from omnibelt import extract_missing_args
 from omnibelt.crafts import NestableCraft, AbstractCrafty
 
 from .errors import GrabError, MissingGadget
-from .abstract import AbstractConsistentGame, AbstractGame, AbstractGadget, AbstractGaggle
+from .abstract import AbstractConsistentGame, AbstractGame, AbstractGadget, AbstractGaggle, AbstractGadgetError
 from .gadgets import FunctionGadget, GadgetBase
 from .gaggles import GaggleBase
 
@@ -186,8 +188,64 @@ class AutoFunctionGadget(FunctionGadget, AbstractGenetic):
 		genes = self._extract_missing_genes()
 		for param in genes:
 			conditions[param.name] = self._find_missing_gene(ctx, param)
+		out = self._call_fn(conditions)
+		if inspect.isawaitable(out):
+			out = self._run_awaitable(out)
+		return out
+
+	def _call_fn(self, conditions: dict[str, Any]) -> Any:
+		'''calls the function with all parents already grabbed (keyed by argument name)'''
 		return self._fn(**conditions)
 
+	def _run_awaitable(self, out: Any) -> Any:
+		'''waits for an async function when grabbed synchronously (use `agrab` to actually benefit from async tools)'''
+		if not asyncio.iscoroutine(out):
+			out = self._await(out)
+		try:
+			asyncio.get_running_loop()
+		except RuntimeError:
+			return asyncio.run(out)
+		# already inside an event loop (e.g. a gate grabbed synchronously during `agrab`), so it must block
+		with ThreadPoolExecutor(1) as pool:
+			return pool.submit(asyncio.run, out).result()
+
+	@staticmethod
+	async def _await(out: Any) -> Any:
+		return await out
+
+	async def _afind_missing_gene(self, ctx: 'AbstractGame', param: inspect.Parameter) -> Any:
+		gizmo = self._arg_map.get(param.name, param.name)
+		agrab = getattr(ctx, 'agrab', None)
+		try:
+			return ctx.grab(gizmo) if agrab is None else await agrab(gizmo)
+		except AbstractGadgetError: # (agrab raises e.g. `MissingGadget` directly rather than a `GrabError`)
+			if param.default == param.empty:
+				raise
+			return param.default
+
+	async def _agrab_from(self, ctx: 'AbstractGame') -> Any:
+		genes = self._extract_missing_genes()
+		# independent parents are resolved concurrently
+		values = await asyncio.gather(*[self._afind_missing_gene(ctx, param) for param in genes])
+		out = self._call_fn({param.name: value for param, value in zip(genes, values)})
+		if inspect.isawaitable(out):
+			out = await out
+		return out
+
+	async def agrab_from(self, ctx: 'AbstractGame', gizmo: str) -> Any:
+		"""
+		Asynchronously grabs the gizmo, where all parents are awaited concurrently (using `ctx.agrab` if available)
+		and the function is awaited if it is async.
+
+		Args:
+			ctx (AbstractGame): The context from which to grab the parents.
+			gizmo (str): The name of the gizmo to grab.
+
+		Returns:
+			Any: The grabbed gizmo.
+		"""
+		return await self._agrab_from(ctx)
+
 
 
 class MIMOGadgetBase(FunctionGadget, AbstractGenetic):
@@ -212,7 +270,8 @@ class MIMOGadgetBase(FunctionGadget, AbstractGenetic):
 			return self._gizmo
 
 
-	def _grab_from_multi_output(self, ctx: Optional[AbstractGame], gizmo: str) -> dict[str, Any]:
+	def _check_multi_output(self, ctx: Optional[AbstractGame], gizmo: str) -> Optional[dict[str, Any]]:
+		'''returns the precomputed outputs if they contain the gizmo and are still valid'''
 		if not isinstance(ctx, AbstractConsistentGame):
 			raise TypeError(f'Cannot use MIMOFunctionGadget with non-consistent game')
 
@@ -221,11 +280,20 @@ class MIMOGadgetBase(FunctionGadget, AbstractGenetic):
 		if all(ctx.is_unchanged(gene) for gene in reqs):
 			cache = ctx.check_gadget_cache(self)
 			if gizmo in cache:
-				return cache[gizmo]
+				return cache
 			elif len(cache):
 				raise NotImplementedError(f'Cache should either be empty or contain all gizmos, got {cache.keys()}')
 
-		out = super().grab_from(ctx, gizmo)
+
+	def _grab_from_multi_output(self, ctx: Optional[AbstractGame], gizmo: str) -> dict[str, Any]:
+		cache = self._check_multi_output(ctx, gizmo)
+		if cache is not None:
+			return cache[gizmo]
+		return self._split_multi_output(ctx, gizmo, super().grab_from(ctx, gizmo))
+
+
+	def _split_multi_output(self, ctx: Optional[AbstractGame], gizmo: str, out: Any) -> Any:
+		'''stores all outputs in the gadget cache of the game and returns the requested one'''
 		order = self._multi_output_order(gizmo)
 
 		assert isinstance(out, (dict, tuple)), f'Expected MIMO function to return dict or tuple, got {type(out)}'
@@ -272,6 +340,15 @@ class AutoMIMOFunctionGadget(MIMOGadgetBase, AutoFunctionGadget):
 			return tuple(self._arg_map.get(gizmo, gizmo) for gizmo in super()._multi_output_order(gizmo))
 
 
+	async def agrab_from(self, ctx: Optional[AbstractGame], gizmo: str) -> Any:
+		if self._multi_output_order(gizmo) is None:
+			return await super().agrab_from(ctx, gizmo)
+		cache = self._check_multi_output(ctx, gizmo)
+		if cache is not None:
+			return cache[gizmo]
+		return self._split_multi_output(ctx, gizmo, await self._agrab_from(ctx))
+
+
 
 class Parentable(NestableCraft):
 	def __init__(self, *args, parents: tuple = None, **kwargs):
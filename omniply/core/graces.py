@@ -3,6 +3,7 @@ from .errors import GrabError, SkipGadget
 from .abstract import AbstractGame, AbstractGadget
 from .gaggles import GaggleBase, LoopyGaggle
 from .games import CacheGame
+from .frames import FrameState
 
 from itertools import tee, chain
 from functools import partial
@@ -79,12 +80,11 @@ class GracefulRepeater(AbstractGraceful):
 
 
 class GracefulGaggle(GaggleBase):
-	def __init__(self, *args, **kwargs):
-		super().__init__(*args, **kwargs)
-		self._grab_tree = {}
-		self._grab_trace = []
-		self._grabber_stack = {}
-		self._grab_query = None
+	# state of the ongoing grab (separately for each thread)
+	_grab_tree = FrameState(dict)
+	_grab_trace = FrameState(list)
+	_grabber_stack = FrameState(dict)
+	_grab_query = FrameState()
 
 	def _ask_for_grace(self, ctx: AbstractGame, error: GrabError, gadget: AbstractGadget, keys: Reversible[str]) \
 			-> Optional[list[Tuple[str, AbstractGadget]]]:
@@ -142,21 +142,22 @@ class GracefulGaggle(GaggleBase):
 			AssemblyFailedError: If all gadgets fail to produce the gizmo.
 			MissingGadgetError: If no gadget can produce the gizmo.
 		"""
-		if len(self._grab_trace) == 0:
+		trace, stack = self._grab_trace, self._grabber_stack # (thread-local state, see `FrameState`)
+		if len(trace) == 0:
 			self._grab_query = gizmo
 			self._grab_tree.clear()
-			self._grabber_stack.clear()
-		self._grab_trace.append(gizmo)
+			stack.clear()
+		trace.append(gizmo)
 
-		itr = self._grabber_stack.setdefault(gizmo, self._gadgets(gizmo))
+		itr = stack.setdefault(gizmo, self._gadgets(gizmo))
 
 		try:
 			gadget = next(itr)
 		except self._MissingGadgetError:
-			self._grab_trace.pop() # failed to grab the gizmo, so pop it from the trace
+			trace.pop() # failed to grab the gizmo, so pop it from the trace
 			raise
 		except StopIteration:
-			self._grab_trace.pop() # failed to grab the gizmo, so pop it from the trace
+			trace.pop() # failed to grab the gizmo, so pop it from the trace
 			raise self._MissingGadgetError(gizmo)
 
 		try:
@@ -167,9 +168,9 @@ class GracefulGaggle(GaggleBase):
 
 		except self._GadgetFailure as error:
 			# attempt backtracking
-			grace_path = self._ask_for_grace(ctx, error, gadget, tuple(self._grab_trace))
+			grace_path = self._ask_for_grace(ctx, error, gadget, tuple(trace))
 			if grace_path is None:
-				self._grab_trace.pop() # failed to grab the gizmo, so pop it from the trace
+				trace.pop() # failed to grab the gizmo, so pop it from the trace
 				raise error
 			result = self._graceful_grab(grace_path, error, ctx, gizmo)
 
@@ -177,10 +178,10 @@ class GracefulGaggle(GaggleBase):
 		# 	logger.debug(f'{gadget!r} failed while trying to produce {gizmo!r}')
 		# 	raise
 
-		assert self._grab_trace[-1] == gizmo, (f'Expected {gizmo!r} to be the last in the trace, '
-											   f'but got {self._grab_trace[-1]!r}')
-		self._grab_trace.pop() # completed gizmo, so pop it from the trace
-		self._grab_tree.setdefault(tuple(self._grab_trace), []).append((gizmo, gadget)) # update grab tree
+		assert trace[-1] == gizmo, (f'Expected {gizmo!r} to be the last in the trace, '
+									f'but got {trace[-1]!r}')
+		trace.pop() # completed gizmo, so pop it from the trace
+		self._grab_tree.setdefault(tuple(trace), []).append((gizmo, gadget)) # update grab tree
 
 		# if len(self._grab_trace) == 0:
 		# 	self._grab_tree.clear()
@@ -200,19 +201,13 @@ class GracefulCache(CacheGame, GracefulGaggle):
 					   error: GrabError, ctx: AbstractGame, gizmo: str) -> Any:
 		# clear cache as necessary based on path
 		for target, gadget in path:
-			if target in self.data:
-				del self.data[target]
+			self._uncache(target)
 		return super()._graceful_grab(path, error, ctx, gizmo)
 
 
 class BacktrackingGaggle(LoopyGaggle):
-	_grab_tree: Optional[dict[str, set[str]]]
-	_grab_trace: Optional[list[str]]
-
-	def __init__(self, *args, **kwargs):
-		super().__init__(*args, **kwargs)
-		self._grab_tree = {}
-		self._grab_trace = []
+	_grab_tree: Optional[dict[str, set[str]]] = FrameState(dict)
+	_grab_trace: Optional[list[str]] = FrameState(list)
 
 
 	def _find_backtrack(self, ctx: 'AbstractGame', gizmo: str) -> Optional[list[str]]:
@@ -270,8 +265,7 @@ class BacktrackingGaggle(LoopyGaggle):
 class BacktrackingCache(CacheGame, BacktrackingGaggle):
 	def _attempt_backtrack(self, ctx: 'AbstractGame', gizmo: str, path: list[str]):
 		for dep in path:
-			if dep in self.data:
-				del self.data[dep]
+			self._uncache(dep)
 		return super()._attempt_backtrack(ctx, gizmo, path)
 
 
@@ -1,5 +1,5 @@
-from typing import Iterable, Callable, Any
-from .abstract import AbstractGadget, AbstractGaggle, AbstractGame, AbstractGang
+from typing import Iterable, Callable, Any, Optional
+from .abstract import AbstractGadget, AbstractGaggle, AbstractGame, AbstractGang, AbstractGadgetError
 from .errors import GadgetFailed, MissingGadget
 from .tools import ToolCraftBase, AutoToolCraft, MIMOToolDecorator, AutoToolDecorator
 from .gizmos import DashGizmo
@@ -9,6 +9,10 @@ from .graces import BacktrackingGaggle, BacktrackingCache, GracefulRepeater, Gra
 from .gangs import CachableMechanism, GateBase
 from .recording import RecordableGaggle, RecordableMechanism, RecordableCached
 from .genetics import GeneticGaggle
+from .gameplans import CompilableGaggle, GamePlan
+from .frames import FrameState
+from .concurrency import AsyncGame, ParallelGame
+from .batching import BatchGame
 
 
 
@@ -43,7 +47,7 @@ class tool(AutoToolDecorator):
 
 
 # class ToolKit(BacktrackingGaggle, MutableGaggle, CraftyGaggle, GeneticGaggle): # TODO: replace loopy with backtracking gaggle
-class ToolKit(GracefulGaggle, MutableGaggle, CraftyGaggle, GeneticGaggle): # TODO: replace loopy with backtracking gaggle
+class ToolKit(GracefulGaggle, MutableGaggle, CraftyGaggle, CompilableGaggle): # TODO: replace loopy with backtracking gaggle
 	"""
 	The ToolKit class is a subclass of LoopyGaggle, MutableGaggle, and CraftyGaggle. It provides methods to handle
 	tools in a kit.
@@ -69,7 +73,7 @@ class ToolKit(GracefulGaggle, MutableGaggle, CraftyGaggle, GeneticGaggle): # TOD
 # class Context(GatedCache, ConsistentGame, RollingGame, LoopyGaggle, MutableGaggle, GeneticGaggle, AbstractGame):
 # class Context(GatedCache, ConsistentGame, RollingGame, BacktrackingCache, MutableGaggle, GeneticGaggle, AbstractGame):
 # class Context(GatedCache, ConsistentGame, RollingGame, GracefulCache, MutableGaggle, GeneticGaggle, AbstractGame):
-class Context(GatedCache, ConsistentGame, RollingGame, RecordableCached, GracefulCache, GracefulGaggle, MutableGaggle, GeneticGaggle, AbstractGame):
+class Context(AsyncGame, BatchGame, GatedCache, ConsistentGame, RollingGame, RecordableCached, GracefulCache, GracefulGaggle, MutableGaggle, CompilableGaggle, AbstractGame):
 	"""
 	The Context class is a subclass of GateCache, LoopyGaggle, MutableGaggle, and AbstractGame. It provides methods to handle
 	gadgets in a context.
@@ -98,8 +102,7 @@ class Context(GatedCache, ConsistentGame, RollingGame, RecordableCached, Gracefu
 	def gabel(self, *args, **kwargs):
 		'''effectively a shallow copy, excluding the cache'''
 		new = self.__class__(*args, **kwargs)
-		new.extend(self.vendors())
-		return new
+		return new._share_vendors(self)
 
 
 	def get(self, key: str, default: Any = None) -> Any:
@@ -120,6 +123,94 @@ class Context(GatedCache, ConsistentGame, RollingGame, RecordableCached, Gracefu
 
 
 
+class LeanContext(Context):
+	"""
+	A Context with a fast path for the common case where no recorder is active and no gadget fails.
+
+	Cache hits are a single dict lookup, and cache misses directly call the first gadget that can produce the gizmo.
+	Only once a gadget actually raises (or a recorder is attached) does the context switch to the full machinery
+	(grab trace, grab tree, backtracking, etc.) of `Context`, starting from the same cache as before the fast path
+	was attempted.
+
+	Note that gizmos computed through the fast path are not traced, so overwriting any cached gizmo discards all of
+	them (since any of them may have been computed from it), and `undo`/`purge`/`rollback` don't know about their
+	dependencies.
+	"""
+
+	# state of the current fast path attempt (separately for each thread)
+	_lean_trail = FrameState(list) # gizmos cached by the current fast path attempt
+	_lean_depth = FrameState(int)
+
+	def __init__(self, *args, **kwargs):
+		self._lean_cached = set() # gizmos computed through the fast path (set before super, which may cache items)
+		super().__init__(*args, **kwargs)
+
+
+	def set_cache(self, gizmo: str, val: Any):
+		if gizmo in self.data and self._lean_cached:
+			with self._cache_lock:
+				for past in self._lean_cached: # (their dependencies are unknown, so any may depend on `gizmo`)
+					if past != gizmo: # (purged as usual below)
+						self.purge(past)
+				self._lean_cached.clear()
+		return super().set_cache(gizmo, val)
+
+
+
+	def grab_from(self, ctx: Optional[AbstractGame], gizmo: str) -> Any:
+		"""
+		Tries to grab a gizmo using the fast path, and otherwise defaults to the full machinery of `Context`.
+
+		Args:
+			ctx (Optional[AbstractGame]): The context from which to grab the gizmo.
+			gizmo (str): The name of the gizmo to grab.
+
+		Returns:
+			Any: The grabbed gizmo.
+		"""
+		data = self.data
+		if gizmo in data and self._active_recording is None:
+			if self._cache_policy is not None:
+				self._cache_hit(gizmo)
+			return data[gizmo]
+		if self._active_recording is None and not self._grab_trace and not self._partial_grabs:
+			trail = self._lean_trail
+			start = len(trail)
+			self._lean_depth += 1
+			try:
+				gadget = next(self._gadgets(gizmo), None)
+				if gadget is not None:
+					val = gadget.grab_from(self, gizmo)
+					with self._cache_lock:
+						self[gizmo] = val
+						self._lean_cached.add(gizmo)
+					trail.append(gizmo)
+					self._admit_cache(gizmo, val)
+					return val
+			except AbstractGadgetError:
+				# discard everything cached during this attempt, then let the full machinery handle the failure
+				for past in trail[start:]:
+					self._uncache(past)
+				del trail[start:]
+			finally:
+				self._lean_depth -= 1
+				if self._lean_depth == 0:
+					trail.clear()
+		return super().grab_from(ctx, gizmo)
+
+
+
+class ParallelContext(ParallelGame, Context):
+	"""
+	A Context which grabs independent parents of a gizmo concurrently using a thread pool (see `ParallelGame`).
+
+	Useful when wide dependency graphs contain latency-heavy gadgets (e.g. loading from disk or remote storage, or
+	native code which releases the GIL). For pure-Python CPU-bound gadgets there is no speedup.
+	"""
+	pass
+
+
+
 class Mechanism(RecordableMechanism, MutableGaggle, AbstractGang):
 	"""
 	The Gang class is a subclass of CachableGang, LoopyGaggle, and MutableGaggle.
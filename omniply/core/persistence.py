@@ -0,0 +1,424 @@
+from typing import Any, Optional, Iterator, Union, Dict, Callable, Hashable
+import os
+import inspect
+import sys
+import pickle
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+
+from .genetics import AutoFunctionGadget
+
+
+
+def fingerprint(value: Any) -> str:
+	"""
+	Computes a content hash of a value, so equal values (including numpy arrays) get the same fingerprint.
+
+	Args:
+		value (Any): The value to fingerprint (must be picklable unless it is an array).
+
+	Returns:
+		str: The hex digest of the value.
+	"""
+	digest = hashlib.blake2b(digest_size=20)
+	np = sys.modules.get('numpy')
+	if np is not None and isinstance(value, np.ndarray) and value.dtype != object:
+		digest.update(f'ndarray:{value.dtype.str}:{value.shape}:'.encode())
+		digest.update(np.ascontiguousarray(value).tobytes())
+	else:
+		digest.update(pickle.dumps(value, protocol=4))
+	return digest.hexdigest()
+
+
+
+def code_fingerprint(fn: Callable) -> str:
+	"""
+	Computes a hash of the code of a function (its bytecode, names and constants, including nested functions), so
+	the fingerprint changes whenever the body of the function is edited.
+
+	Args:
+		fn (Callable): The function (or method).
+
+	Returns:
+		str: The hex digest of the code.
+	"""
+	digest = hashlib.blake2b(digest_size=20)
+	codes = [getattr(fn, '__func__', fn).__code__]
+	while codes:
+		code = codes.pop()
+		digest.update(code.co_code)
+		digest.update(repr(code.co_names).encode())
+		for const in code.co_consts:
+			if inspect.iscode(const):
+				codes.append(const)
+			elif isinstance(const, frozenset): # (the order of sets depends on the hash seed)
+				digest.update(repr(sorted(map(repr, const))).encode())
+			else:
+				digest.update(repr(const).encode())
+	return digest.hexdigest()
+
+
+
+class DiskCache:
+	"""
+	Content-addressed store of gizmo values on local disk, so values can be reused across runs and processes.
+
+	Values are keyed by the identity of the gadget that produced them and a fingerprint of the parent values that were
+	used. Arrays are stored as `.npy` (if numpy is available), everything else is pickled. Writes are atomic (the
+	file is written to a temporary file in the same directory before being renamed), so concurrent readers never
+	see partial values.
+
+	If `max_bytes` is set, the least recently used files are deleted whenever the cache grows beyond the cap (down to
+	`evict_to` of the cap). To keep writes cheap, the total size is tracked in memory, and the directory is only
+	scanned on the first write and whenever the cap is exceeded (so values written by other processes are only
+	accounted for at the next scan).
+
+	Attributes:
+		root (Path): Directory where values are stored.
+		max_bytes (Optional[int]): Size cap of the cache on disk.
+		evict_to (float): Fraction of the cap the cache is trimmed to once it grows beyond the cap.
+		hits (int): Number of values loaded from disk.
+		misses (int): Number of values that were not found.
+		writes (int): Number of values stored.
+		evictions (int): Number of files deleted due to the size cap.
+		errors (int): Number of values that could not be loaded or stored.
+	"""
+
+	_default_cache = None
+	evict_to = 0.9
+
+	def __init__(self, root: Union[str, Path, None] = None, *, max_bytes: Optional[int] = None, **kwargs):
+		if root is None:
+			root = os.environ.get('OMNIPLY_CACHE_DIR', Path.home() / '.cache' / 'omniply')
+		super().__init__(**kwargs)
+		self.root = Path(root)
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+		self.writes = 0
+		self.evictions = 0
+		self.errors = 0
+		self._known_bytes = None # total size as of the last scan plus everything written since (None before a scan)
+
+
+	def __repr__(self):
+		return f'{self.__class__.__name__}({str(self.root)!r})'
+
+
+	@classmethod
+	def default(cls) -> 'DiskCache':
+		"""Returns the shared cache used by `tool(..., persist=True)` (see `OMNIPLY_CACHE_DIR`)."""
+		if cls._default_cache is None:
+			cls._default_cache = cls()
+		return cls._default_cache
+
+
+	@staticmethod
+	def key(identity: str, conditions: Dict[str, Any]) -> str:
+		"""
+		Computes the key for a value given the identity of its gadget and the parent values.
+
+		Args:
+			identity (str): Identifies the gadget (and the gizmo) that produces the value.
+			conditions (dict[str, Any]): The parent values (by argument name).
+
+		Returns:
+			str: The key.
+		"""
+		digest = hashlib.blake2b(identity.encode(), digest_size=20)
+		for name, value in sorted(conditions.items()):
+			digest.update(f'{name}={fingerprint(value)};'.encode())
+		return digest.hexdigest()
+
+
+	_suffixes = ('.npy', '.pkl')
+	def _path(self, key: str, suffix: str) -> Path:
+		return self.root / key[:2] / f'{key}{suffix}'
+
+
+	def load(self, key: str) -> Any:
+		"""
+		Loads a value from disk.
+
+		Args:
+			key (str): The key of the value.
+
+		Returns:
+			Any: The stored value.
+
+		Raises:
+			KeyError: If the value is not stored (or could not be loaded).
+		"""
+		for suffix in self._suffixes:
+			path = self._path(key, suffix)
+			try:
+				if suffix == '.npy':
+					import numpy as np
+					value = np.load(path, allow_pickle=False)
+				else:
+					with open(path, 'rb') as f:
+						value = pickle.load(f)
+			except (FileNotFoundError, ImportError):
+				continue
+			except Exception:
+				# corrupt or incompatible file - remove it so it gets recomputed
+				self.errors += 1
+				path.unlink(missing_ok=True)
+				continue
+			try:
+				os.utime(path) # mark as recently used
+			except OSError:
+				pass
+			self.hits += 1
+			return value
+		self.misses += 1
+		raise KeyError(key)
+
+
+	def store(self, key: str, value: Any) -> bool:
+		"""
+		Atomically writes a value to disk (and evicts old values if the cache is too large).
+
+		Args:
+			key (str): The key of the value.
+			value (Any): The value to store.
+
+		Returns:
+			bool: True if the value was stored, False if it could not be serialized.
+		"""
+		np = sys.modules.get('numpy')
+		is_array = np is not None and isinstance(value, np.ndarray) and value.dtype != object
+		path = self._path(key, '.npy' if is_array else '.pkl')
+		path.parent.mkdir(parents=True, exist_ok=True)
+		fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+		try:
+			with os.fdopen(fd, 'wb') as f:
+				if is_array:
+					np.save(f, value, allow_pickle=False)
+				else:
+					pickle.dump(value, f, protocol=4)
+			os.replace(tmp, path)
+		except Exception:
+			self.errors += 1
+			Path(tmp).unlink(missing_ok=True)
+			return False
+		self.writes += 1
+		if self.max_bytes is not None:
+			if self._known_bytes is not None:
+				try:
+					self._known_bytes += path.stat().st_size
+				except OSError:
+					pass
+			if self._known_bytes is None or self._known_bytes > self.max_bytes:
+				self._enforce_cap()
+		return True
+
+
+	def files(self) -> Iterator[Path]:
+		"""Lists all files of stored values."""
+		if self.root.exists():
+			for path in self.root.glob('*/*'):
+				if path.suffix in self._suffixes:
+					yield path
+
+
+	def _enforce_cap(self) -> None:
+		entries = []
+		total = 0
+		for path in self.files():
+			try:
+				stat = path.stat()
+			except FileNotFoundError:
+				continue
+			entries.append((stat.st_mtime, stat.st_size, path))
+			total += stat.st_size
+		entries.sort(key=lambda entry: entry[0])
+		# trimming below the cap leaves room for the next writes before the directory has to be scanned again
+		target = self.max_bytes if total <= self.max_bytes else int(self.max_bytes * self.evict_to)
+		for _, size, path in entries:
+			if total <= target:
+				break
+			path.unlink(missing_ok=True)
+			total -= size
+			self.evictions += 1
+		self._known_bytes = total
+
+
+	def clear(self) -> None:
+		"""Deletes all stored values."""
+		for path in list(self.files()):
+			path.unlink(missing_ok=True)
+		self._known_bytes = None
+
+
+	def stats(self) -> Dict[str, int]:
+		"""
+		Returns the counters of this cache and the current number (and total size) of stored values.
+
+		Returns:
+			dict[str, int]: The stats.
+		"""
+		sizes = [path.stat().st_size for path in self.files()]
+		return {'hits': self.hits, 'misses': self.misses, 'writes': self.writes, 'evictions': self.evictions,
+				'errors': self.errors, 'files': len(sizes), 'bytes': sum(sizes)}
+
+
+
+class PersistentGadget(AutoFunctionGadget):
+	"""
+	Mix-in for function gadgets to store their outputs in a `DiskCache`, so the function is only called if the same
+	parent values have never been seen before (in any run or process sharing the cache).
+
+	The function should be pure, since the value is identified only by the (qualified) name and the code of the
+	function, the gizmos it produces and the parent values. For methods (e.g. tools of a kit), the public attributes
+	of the owner (e.g. the hyperparameters of the kit) are also part of the identity, so attributes that the output
+	depends on must not be private. Values are never persisted if the parent values or the owner's attributes cannot
+	be fingerprinted.
+	"""
+
+	_DiskCache = DiskCache
+
+	def __init__(self, *args, persist: Union[bool, DiskCache, None] = None, **kwargs):
+		"""
+		Args:
+			persist (Union[bool, DiskCache, None]): The cache to use, or True to use the default cache.
+		"""
+		if persist is True:
+			persist = self._DiskCache.default()
+		super().__init__(*args, **kwargs)
+		self._persist = persist or None
+
+
+	def _persistent_identity(self) -> str:
+		fn = getattr(self._fn, '__func__', self._fn)
+		identity = f'{fn.__module__}.{fn.__qualname__}:{self._gizmo}:{code_fingerprint(fn)}'
+		owner = getattr(self._fn, '__self__', None)
+		if owner is not None:
+			state = {name: value for name, value in vars(owner).items() if not name.startswith('_')}
+			identity = f'{identity}:{fingerprint(sorted(state.items()))}'
+		return identity
+
+
+	def _call_fn(self, conditions: dict[str, Any]) -> Any:
+		if self._persist is None:
+			return super()._call_fn(conditions)
+		try:
+			key = self._persist.key(self._persistent_identity(), conditions)
+		except Exception:
+			return super()._call_fn(conditions)
+		try:
+			return self._persist.load(key)
+		except KeyError:
+			pass
+		out = super()._call_fn(conditions)
+		if inspect.isawaitable(out):
+			return self._store_awaited(key, out)
+		self._persist.store(key, out)
+		return out
+
+
+	async def _store_awaited(self, key: str, out: Any) -> Any:
+		out = await out
+		self._persist.store(key, out)
+		return out
+
+
+
+class PureGadget(AutoFunctionGadget):
+	"""
+	Mix-in for function gadgets to memoize their outputs across contexts (in memory), keyed by the parent values.
+
+	Only the `memo_size` most recently used outputs are kept. Parent values must be hashable, unless a `fingerprint`
+	function is provided to convert them into something hashable (e.g. `fingerprint=True` uses the content hash
+	`fingerprint()`, which also supports numpy arrays). Calls with parent values that cannot be hashed are not
+	memoized.
+
+	Note that the same output object is returned to all contexts, so it should not be modified in place.
+	"""
+
+	_default_fingerprint = staticmethod(fingerprint)
+
+	def __init__(self, *args, pure: bool = False, memo_size: Optional[int] = 128,
+				 fingerprint: Union[bool, Callable[[Any], Hashable], None] = None, **kwargs):
+		"""
+		Args:
+			pure (bool): Whether to memoize the outputs.
+			memo_size (Optional[int]): Maximum number of memoized outputs (None for unbounded).
+			fingerprint (Union[bool, Callable[[Any], Hashable], None]): Converts parent values into hashable keys.
+		"""
+		if fingerprint is True:
+			fingerprint = self._default_fingerprint
+		super().__init__(*args, **kwargs)
+		self._memo = {} if pure else None
+		self._memo_size = memo_size
+		self._memo_lock = threading.Lock()
+		self._fingerprint = fingerprint or None
+
+
+	def __getstate__(self):
+		state = super().__getstate__() if hasattr(super(), '__getstate__') else self.__dict__
+		state = state.copy()
+		# memoized outputs are not sent along (e.g. to worker processes), and locks can't be pickled
+		state['_memo'] = None if self._memo is None else {}
+		del state['_memo_lock']
+		return state
+
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self._memo_lock = threading.Lock()
+
+
+	def clear_memo(self) -> None:
+		"""Forgets all memoized outputs."""
+		if self._memo is not None:
+			with self._memo_lock:
+				self._memo.clear()
+
+
+	def _memo_key(self, conditions: dict[str, Any]) -> Optional[tuple]:
+		fp = self._fingerprint
+		try:
+			key = tuple((name, value if fp is None else fp(value)) for name, value in conditions.items())
+			hash(key)
+		except Exception:
+			return None
+		return key
+
+
+	def _call_fn(self, conditions: dict[str, Any]) -> Any:
+		memo = self._memo
+		if memo is None:
+			return super()._call_fn(conditions)
+		key = self._memo_key(conditions)
+		if key is None:
+			return super()._call_fn(conditions)
+		with self._memo_lock:
+			if key in memo:
+				out = memo.pop(key)
+				memo[key] = out # mark as most recently used
+				return out
+		out = super()._call_fn(conditions)
+		if inspect.isawaitable(out):
+			return self._memoize_awaited(key, out)
+		self._memoize(key, out)
+		return out
+
+
+	def _memoize(self, key: tuple, out: Any) -> None:
+		memo = self._memo
+		with self._memo_lock:
+			memo[key] = out
+			if self._memo_size is not None and len(memo) > self._memo_size:
+				del memo[next(iter(memo))]
+
+
+	async def _memoize_awaited(self, key: tuple, out: Any) -> Any:
+		out = await out
+		self._memoize(key, out)
+		return out
+
+
+
@@ -7,6 +7,7 @@ from .abstract import AbstractRecordable, AbstractRecorder
 from .graces import GracefulGaggle
 from .gangs import CachableMechanism, GangBase
 from .games import CacheGame, GatedCache, GameBase, AbstractGame
+from .frames import FrameState
 
 
 
@@ -63,25 +64,26 @@ class RecordableBase(AbstractRecordable):
 
 class RecordableGaggle(GracefulGaggle, RecordableBase):
 	def grab_from(self, ctx: 'AbstractGame', gizmo: str) -> Any:
-		if len(self._grab_trace) == 0:
+		trace, stack = self._grab_trace, self._grabber_stack # (thread-local state, see `FrameState`)
+		if len(trace) == 0:
 			self._grab_query = gizmo
 			self._grab_tree.clear()
-			self._grabber_stack.clear()
-		self._grab_trace.append(gizmo)
+			stack.clear()
+		trace.append(gizmo)
 
-		itr = self._grabber_stack.setdefault(gizmo, self._gadgets(gizmo))
+		itr = stack.setdefault(gizmo, self._gadgets(gizmo))
 
 		try:
 			gadget = next(itr)
 		except self._MissingGadgetError:
 			if self._active_recording: # recent change
 				self._active_recording.missing(gizmo)
-			self._grab_trace.pop()  # failed to grab the gizmo, so pop it from the trace
+			trace.pop()  # failed to grab the gizmo, so pop it from the trace
 			raise
 		except StopIteration:
 			if self._active_recording: # recent change
 				self._active_recording.missing(gizmo)
-			self._grab_trace.pop()  # failed to grab the gizmo, so pop it from the trace
+			trace.pop()  # failed to grab the gizmo, so pop it from the trace
 			raise self._MissingGadgetError(gizmo)
 
 		if self._active_recording:
@@ -99,9 +101,9 @@ class RecordableGaggle(GracefulGaggle, RecordableBase):
 				self._active_recording.failure(gizmo, gadget, error)
 
 			# attempt backtracking
-			grace_path = self._ask_for_grace(ctx, error, gadget, tuple(self._grab_trace))
+			grace_path = self._ask_for_grace(ctx, error, gadget, tuple(trace))
 			if grace_path is None:
-				self._grab_trace.pop()  # failed to grab the gizmo, so pop it from the trace
+				trace.pop()  # failed to grab the gizmo, so pop it from the trace
 				raise error
 			result = self._graceful_grab(grace_path, error, ctx, gizmo)
 
@@ -111,10 +113,10 @@ class RecordableGaggle(GracefulGaggle, RecordableBase):
 		# 	logger.debug(f'{gadget!r} failed while trying to produce {gizmo!r}')
 		# 	raise
 
-		assert self._grab_trace[-1] == gizmo, (f'Expected {gizmo!r} to be the last in the trace, '
-											   f'but got {self._grab_trace[-1]!r}')
-		self._grab_trace.pop()  # completed gizmo, so pop it from the trace
-		self._grab_tree.setdefault(tuple(self._grab_trace), []).append((gizmo, gadget))  # update grab tree
+		assert trace[-1] == gizmo, (f'Expected {gizmo!r} to be the last in the trace, '
+									f'but got {trace[-1]!r}')
+		trace.pop()  # completed gizmo, so pop it from the trace
+		self._grab_tree.setdefault(tuple(trace), []).append((gizmo, gadget))  # update grab tree
 
 		# if len(self._grab_trace) == 0:
 		# 	self._grab_tree.clear()
@@ -165,16 +167,21 @@ class RecordableCached(CacheGame, RecordableGame, RecordableGaggle):
 		"""
 		if gizmo in self.data:
 			out = self.data[gizmo]
+			if self._cache_policy is not None:
+				self._cache_hit(gizmo)
 			if self._active_recording:
 				self._active_recording.cached(gizmo, out)
 			return out
 		val = self._cache_miss(ctx, gizmo)
 		self[gizmo] = val  # cache packaged val
+		self._admit_cache(gizmo, val)
 		return val
 
 
 
 class RecordableMechanism(CachableMechanism, RecordableGaggle):
+	_active_recording = FrameState() # borrowed from the external context during a grab
+
 	def _grab(self, gizmo: str) -> Any:
 		"""
 		Tries to grab a gizmo from the gate. If the gizmo is not found in the gate's cache, it checks the cache using
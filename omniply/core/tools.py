@@ -1,10 +1,14 @@
-from typing import Iterator, Optional, Any, Iterable, Callable
+from typing import Iterator, Optional, Any, Iterable, Callable, Union
+from concurrent.futures import Executor
 from omnibelt.crafts import AbstractSkill, AbstractCraft, AbstractCrafty, NestableCraft
 
 from .abstract import AbstractGadget, AbstractGaggle, AbstractGame
 from .graces import GracefulRepeater
 from .gadgets import GadgetBase, FunctionGadget
 from .genetics import AutoMIMOFunctionGadget, MIMOGadgetBase, Parentable, AbstractGenetic, Gene, ParentedSkill
+from .persistence import PersistentGadget, PureGadget, DiskCache
+from .concurrency import ProcessGadget
+from .batching import BatchedGadget
 
 
 
@@ -112,10 +116,28 @@ class ToolCraft(GracefulCraft, Parentable, ToolCraftBase, MIMOGadgetBase):
 		pass
 
 
-class AutoToolCraft(GracefulCraft, AutoMIMOFunctionGadget, ToolCraftBase):
-	class _ToolSkill(GracefulRepeater, AutoMIMOFunctionGadget, SkillBase):
+class AutoToolCraft(GracefulCraft, PureGadget, PersistentGadget, ProcessGadget, BatchedGadget, AutoMIMOFunctionGadget,
+					ToolCraftBase):
+	class _ToolSkill(GracefulRepeater, PureGadget, PersistentGadget, ProcessGadget, BatchedGadget,
+					 AutoMIMOFunctionGadget, SkillBase):
 		pass
 
+	def as_skill(self, owner: AbstractCrafty, persist=None, **kwargs) -> SkillBase:
+		if persist is None:
+			persist = self._persist
+		if self._executor is not None:
+			kwargs.setdefault('executor', self._executor)
+		if self._batched:
+			kwargs.setdefault('batched', True)
+		if self._vectorized:
+			kwargs.setdefault('vectorized', self._vectorized)
+		if self._memo is not None:
+			# every skill gets its own memo (since the method may depend on the owner)
+			kwargs.setdefault('pure', True)
+			kwargs.setdefault('memo_size', self._memo_size)
+			kwargs.setdefault('fingerprint', self._fingerprint)
+		return super().as_skill(owner, persist=persist, **kwargs)
+
 
 
 class ToolDecoratorBase: # GadgetBase
@@ -269,6 +291,48 @@ class AutoToolDecorator(MIMOToolDecorator):
 	"""
 	_ToolCraft = AutoToolCraft
 
+	def __init__(self, *gizmos: str, persist: Union[bool, DiskCache, None] = None, pure: bool = False,
+				 memo_size: Optional[int] = 128, fingerprint: Union[bool, Callable[[Any], Any], None] = None,
+				 executor: Union[str, Executor, None] = None, batched: bool = False,
+				 vectorized: Union[bool, Iterable[str]] = False, **kwargs):
+		"""
+		Args:
+			persist (Union[bool, DiskCache, None]): Store the outputs on disk (keyed by the parent values), either in
+			the given `DiskCache` or (if True) in the default one.
+			pure (bool): Memoize the outputs across contexts (keyed by the parent values).
+			memo_size (Optional[int]): Maximum number of memoized outputs (only used if `pure`).
+			fingerprint (Union[bool, Callable[[Any], Any], None]): Converts parent values to hashable keys for the
+			memo (only used if `pure`), True uses a content hash (e.g. for arrays).
+			executor (Union[str, Executor, None]): Run the function in a worker, either `'process'` (shared process
+			pool), `'thread'` (shared thread pool) or the given executor (see `ProcessGadget`).
+			batched (bool): The function expects all parents stacked along a new first dimension and returns stacked
+			outputs, so it can be called once for many contexts (see `BatchedGadget` and `grab_many`).
+			vectorized (Union[bool, Iterable[str]]): The function is written per-sample, so when grabbed from a batch
+			it is called for each sample (optionally only the given arguments are stacked, see `BatchedGadget`).
+		"""
+		super().__init__(*gizmos, **kwargs)
+		self._persist = persist
+		self._pure = pure
+		self._memo_size = memo_size
+		self._fingerprint = fingerprint
+		self._executor = executor
+		self._batched = batched
+		self._vectorized = vectorized
+
+
+	def _actualize_tool(self, fn: Callable, **kwargs):
+		if self._persist:
+			kwargs['persist'] = self._persist
+		if self._pure:
+			kwargs.update(pure=True, memo_size=self._memo_size, fingerprint=self._fingerprint)
+		if self._executor is not None:
+			kwargs['executor'] = self._executor
+		if self._batched:
+			kwargs['batched'] = True
+		if self._vectorized:
+			kwargs['vectorized'] = self._vectorized
+		return super()._actualize_tool(fn, **kwargs)
+
 
 
 
@@ -876,6 +876,809 @@ def test_backtrack():
 	assert ctx['b'] == 'worked'
 
 
+def test_compile():
+	class Kit1(ToolKit):
+		@tool('b')
+		def f(self, a):
+			return a + 1
+		@tool('c')
+		def g(self, b):
+			return b * 2
+		@tool('c')
+		def g2(self, z): # z is missing, so this gadget is skipped when compiling
+			return -z
+		@tool('d')
+		def h(self, b, c, e=100):
+			return b + c + e
+
+	kit = Kit1()
+	plan = kit.compile('d', given=['a'])
+
+	assert [gizmo for gizmo, _ in plan] == ['b', 'c', 'd']
+	assert plan.steps[1][1].__call__ == kit.g
+
+	ctx = Context(kit)
+	assert plan.execute(ctx, a=1) == {'d': 106}
+	assert ctx.is_cached('c') and ctx['c'] == 4
+
+	plan = kit.compile('d', given=['a', 'z'])
+	ctx = Context(kit)
+	ctx['a'] = 2
+	ctx['z'] = 10
+	assert plan.execute(ctx) == {'d': 93}
+
+	class Kit2(ToolKit):
+		@tool('b')
+		def f(self, a):
+			return a + 1
+		@tool('c')
+		def g(self, b):
+			return b * 2
+		@tool('p', 'q')
+		def h(self, c):
+			return c + 1, -c
+
+	kit = Kit2()
+	ctx = Context(kit)
+	assert kit.compile('c', 'p', 'q', given=['a']).execute(ctx, a=1) == {'c': 4, 'p': 5, 'q': -4}
+	ctx['a'] = 10 # the intermediates are traced, so they are recomputed
+	assert not ctx.is_cached('c') and not ctx.is_cached('q')
+	assert ctx['c'] == 22 and ctx['p'] == 23 and ctx['q'] == -22
+
+
+def test_compile_fallback():
+	class Kit1(ToolKit):
+		@tool('a')
+		def f(self):
+			return 1
+		@tool('b')
+		def g(self, a):
+			return a + 1
+
+	kit = Kit1()
+
+	@tool('b')
+	def flaky(a):
+		raise GadgetFailed
+
+	ctx = Context(kit, flaky)
+	plan = ctx.compile('b')
+	assert len(plan) == 2
+	assert plan.execute(ctx.gabel()) == {'b': 2}
+
+
+
+def test_lean_context():
+	from .op import LeanContext
+
+	@tool('y')
+	def f(x):
+		return x + 1
+
+	@tool('z')
+	def g(x, y):
+		return x + y
+
+	ctx = LeanContext(f, g)
+	ctx['x'] = 1
+	assert ctx['z'] == 3
+	assert ctx.is_cached('y')
+	assert ctx.grab('w', None) is None
+
+	ctx['x'] = 10 # overwriting an input discards what was computed from it (like with a regular context)
+	assert ctx['y'] == 11 and ctx['z'] == 21
+
+	count = 0
+	class Kit1(ToolKit):
+		@tool('a', repeat=1)
+		def f(self):
+			nonlocal count
+			count += 1
+			return count
+		@tool('b')
+		def g(self, a):
+			if a == 1:
+				raise GadgetFailed # forces backtrack through the full machinery
+			return 'worked'
+
+	ctx = LeanContext(Kit1())
+	assert ctx['b'] == 'worked'
+	assert ctx['a'] == 2
+
+	# recorders see the same events as with a regular context (including cache hits)
+	from .recording import RecorderBase
+	events = []
+	for cls in [Context, LeanContext]:
+		ctx = cls(f, g).record(RecorderBase())
+		ctx['x'] = 1
+		assert ctx['y'] == 2 and ctx['y'] == 2
+		events.append([(event[0], event[1]) for event in ctx.report()])
+	assert events[0] == events[1] and ('cached', 'y') in events[1]
+
+
+
+def test_vendor_index():
+	@tool('y')
+	def f(x):
+		return x + 1
+
+	@tool('y')
+	def f2(x):
+		return x - 1
+
+	inner = ToolKit(f)
+	outer = ToolKit(inner)
+	ctx = Context(outer)
+	ctx['x'] = 1
+	assert ctx['y'] == 2
+	assert ctx._vendor_index['y'] == (f,)
+
+	version = ctx._vendor_version
+	inner.include(f2) # change is propagated to all gaggles including `inner`
+	assert ctx._vendor_version > version
+	assert 'y' not in ctx._vendor_index
+
+	ctx.clear_cache()
+	ctx['x'] = 1
+	assert ctx['y'] == 0
+
+	inner.exclude(f2)
+	ctx.clear_cache()
+	ctx['x'] = 1
+	assert ctx['y'] == 2
+
+	ctx.exclude(outer)
+	inner.include(f2)
+	assert ctx._vendor_index == {}
+	assert id(ctx) not in outer._vendor_watchers
+
+
+
+def test_reinclude_and_rollback():
+	@tool('y')
+	def f(x):
+		return x + 1
+
+	@tool('y')
+	def f2(x):
+		return x - 1
+
+	kit = ToolKit(f, f2)
+	assert list(kit.vendors()) == [f, f2]
+	kit.include(f2) # re-adding a gadget moves it to the front
+	assert list(kit.vendors()) == [f2, f]
+	assert list(kit.vendors('y')) == [f2, f]
+
+	@tool('z')
+	def g(x):
+		return 2 * x
+
+	@tool('w')
+	def h(x):
+		ctx.include(g) # included during the creation of 'w'
+		return ctx['z']
+
+	ctx = Context(f, h)
+	ctx['x'] = 3
+	assert ctx['w'] == 6
+	assert ctx.gives('z')
+
+	ctx.rollback('w')
+	assert not ctx.is_cached('w')
+	assert list(ctx.vendors()) == [f, h]
+	assert ctx._rolling_owners == {}
+
+
+
+def test_gabel():
+	@tool('y')
+	def f(x):
+		return x + 1
+
+	@tool('y')
+	def f2(x):
+		return x - 1
+
+	@tool('z')
+	def g(y):
+		return 2 * y
+
+	ctx = Context(f, g)
+	ctx['x'] = 1
+	assert ctx['z'] == 4
+
+	fork = ctx.gabel()
+	assert fork._gadgets_table is ctx._gadgets_table # shared until modified
+	assert not fork.is_cached('x')
+	fork['x'] = 2
+	assert fork['z'] == 6
+
+	fork.include(f2)
+	assert fork._gadgets_table is not ctx._gadgets_table
+	assert list(fork.vendors()) == [f2, f, g]
+	assert list(ctx.vendors()) == [f, g]
+	assert fork['y'] == 3 # cached
+	fork.clear_cache()
+	fork['x'] = 2
+	assert fork['z'] == 2
+
+	ctx.clear_cache()
+	ctx['x'] = 2
+	assert ctx['z'] == 6
+
+	other = Context(f2)._share_vendors(ctx, skip=[g]) # merged instead of shared
+	assert list(other.vendors()) == [f, f2]
+
+
+
+
+def test_cache_policy():
+	from .garbage import LRUCachePolicy, LFUCachePolicy
+
+	calls = []
+
+	@tool('y')
+	def f(x):
+		calls.append('y')
+		return x + 1
+
+	@tool('z')
+	def g(x):
+		calls.append('z')
+		return x + 2
+
+	@tool('w')
+	def h(y, z):
+		calls.append('w')
+		return y * z
+
+	ctx = Context(f, g, h, cache_policy=LRUCachePolicy(max_items=2))
+	ctx['x'] = 1 # set manually, so never evicted
+	assert ctx['w'] == 6
+	assert calls == ['y', 'z', 'w']
+	assert ctx.is_cached('x') and ctx.is_cached('w') and not ctx.is_cached('y')
+	assert ctx['z'] == 3 # hit
+	assert ctx['y'] == 2 # recomputed, evicts 'w'
+	assert calls == ['y', 'z', 'w', 'y']
+	assert not ctx.is_cached('w')
+	stats = ctx.cache_stats()
+	assert (stats['hits'], stats['misses'], stats['evictions'], stats['items']) == (4, 4, 2, 2) # includes hits of 'x'
+
+	ctx['x'] = 2 # purges everything computed from 'x'
+	assert ctx['w'] == 12
+	assert ctx.cache_stats()['items'] == 2
+
+	calls.clear()
+	ctx = Context(f, g, h, cache_policy=LFUCachePolicy(max_items=2))
+	ctx['x'] = 1
+	assert ctx['y'] == 2 and ctx['y'] == 2 # 'y' is used twice
+	assert ctx['z'] == 3
+	assert ctx['w'] == 6 # evicts 'z'
+	assert ctx.is_cached('y') and not ctx.is_cached('z')
+
+	policy = LRUCachePolicy(max_bytes=100, size_estimator=lambda val: 60)
+	ctx = Context(f, g, h, cache_policy=policy)
+	ctx['x'] = 1
+	assert ctx['w'] == 6
+	assert list(ctx.cached()) == ['x', 'w']
+	assert policy.total_bytes == 60 and policy.evictions == 2
+
+	@tool('s', 'p')
+	def mimo(a, b):
+		calls.append('mimo')
+		return a + b, a * b
+
+	calls.clear()
+	ctx = Context(mimo, cache_policy=LRUCachePolicy(max_items=1))
+	ctx.update({'a': 2, 'b': 3})
+	assert ctx['s'] == 5
+	assert ctx['p'] == 6 # from the precomputed outputs, evicts 's' (and the precomputed outputs)
+	assert not ctx.is_cached('s') and not len(ctx._gadget_precomputes)
+	assert ctx['s'] == 5
+	assert calls == ['mimo', 'mimo']
+
+	gate = Gate(f, gate={'y': 'out'})
+	ctx = Context(gate, cache_policy=LRUCachePolicy(max_items=0))
+	ctx['x'] = 1
+	assert ctx['out'] == 2
+	assert not len(ctx._gate_cache) and not ctx.is_cached('out')
+
+
+
+def test_persist():
+	import tempfile
+	from .persistence import DiskCache
+
+	calls = []
+
+	with tempfile.TemporaryDirectory() as root:
+		cache = DiskCache(root)
+
+		@tool('y', persist=cache)
+		def f(x):
+			calls.append(x)
+			return {'x': x, 'y': [x] * 3}
+
+		ctx = Context(f)
+		ctx['x'] = 1
+		assert ctx['y'] == {'x': 1, 'y': [1, 1, 1]}
+		ctx = Context(f)
+		ctx['x'] = 1
+		assert ctx['y'] == {'x': 1, 'y': [1, 1, 1]} # loaded from disk
+		ctx['x'] = 2
+		assert ctx['y']['x'] == 2
+		assert calls == [1, 2]
+
+		class Kit(ToolKit):
+			@tool('z', persist=cache)
+			def g(self, x):
+				calls.append(-x)
+				return x + 1
+
+		other = DiskCache(root) # e.g. another process
+		kit = Kit()
+		skill = next(kit._gadgets('z'))
+		assert skill._persist is cache
+		ctx = Context(kit)
+		ctx['x'] = 1
+		assert ctx['z'] == 2
+		assert list(cache.files()) and cache.stats()['files'] == 3
+		assert other.load(other.key(skill._persistent_identity(), {'x': 1})) == 2
+
+		stats = cache.stats()
+		assert (stats['hits'], stats['misses'], stats['writes']) == (1, 3, 3)
+
+		cache.max_bytes = 0
+		cache.store('abc', 1)
+		assert cache.stats()['files'] == 0 and cache.evictions == 4
+
+		scans = []
+		files = cache.files
+		cache.files = lambda: scans.append(1) or files()
+		cache.max_bytes = 10**6
+		for i in range(20):
+			cache.store(f'key{i}', bytes(100))
+		assert not scans # the size is known from the last scan (and tracked in memory until the cap is exceeded)
+		cache.max_bytes = 2000
+		for i in range(20, 60):
+			cache.store(f'key{i}', bytes(100))
+		assert cache.stats()['bytes'] <= 2000 and 0 < len(scans) < 40
+
+		# the identity includes the code of the function and (for methods) the public attributes of the owner
+		fresh = DiskCache(f'{root}/identity')
+
+		@tool('w', persist=fresh)
+		def h(x):
+			return x + 1
+		first = h
+
+		@tool('w', persist=fresh)
+		def h(x): # (e.g. edited between two runs)
+			return x + 2
+
+		assert Context(first, x=1)['w'] == 2 and Context(h, x=1)['w'] == 3
+
+		class Offset(ToolKit):
+			def __init__(self, offset, **kwargs):
+				super().__init__(**kwargs)
+				self.offset = offset
+
+			@tool('v', persist=fresh)
+			def get_v(self, x):
+				return x + self.offset
+
+		assert Context(Offset(0), x=1)['v'] == 1 and Context(Offset(100), x=1)['v'] == 101
+		assert Context(Offset(100), x=1)['v'] == 101 and fresh.hits == 1
+
+
+
+def test_pure():
+	calls = []
+
+	@tool('y', pure=True, memo_size=2)
+	def f(x):
+		calls.append(x)
+		return x + 1
+
+	for x in [1, 2, 1, 3, 1, 2]:
+		ctx = Context(f)
+		ctx['x'] = x
+		assert ctx['y'] == x + 1
+	assert calls == [1, 2, 3, 2] # 2 was evicted by 3
+
+	f.clear_memo()
+	ctx = Context(f)
+	ctx['x'] = 1
+	assert ctx['y'] == 2 and calls == [1, 2, 3, 2, 1]
+
+	@tool('n', pure=True)
+	def h(x):
+		calls.append(x)
+		return len(x)
+
+	for _ in range(2):
+		ctx = Context(h)
+		ctx['x'] = [1] # unhashable, so not memoized
+		assert ctx['n'] == 1
+	assert calls[-2:] == [[1], [1]]
+
+	class Kit(ToolKit):
+		def __init__(self, offset, **kwargs):
+			super().__init__(**kwargs)
+			self.offset = offset
+
+		@tool('z', pure=True, fingerprint=True)
+		def g(self, x):
+			calls.append(tuple(x))
+			return sum(x) + self.offset
+
+	calls.clear()
+	kit1, kit2 = Kit(0), Kit(10)
+	for kit, x in [(kit1, [1, 2]), (kit1, [1, 2]), (kit2, [1, 2]), (kit1, [3])]:
+		ctx = Context(kit)
+		ctx['x'] = x
+		assert ctx['z'] == sum(x) + kit.offset
+	assert calls == [(1, 2), (1, 2), (3,)] # every kit has its own memo
+
+
+
+def test_concurrent_grabs():
+	import threading
+
+	class Kit(ToolKit):
+		@tool('a')
+		def get_a(self, x):
+			if x % 3 == 0:
+				raise GadgetFailed
+			return x + 1
+
+		@tool('b')
+		def get_b(self, a, y):
+			return a * y
+
+	kit = Kit()
+	gate = Gate(kit, gate={'b': 'c'})
+	shared = Context(kit)
+	shared['x'] = 1
+	shared['y'] = 2
+
+	num_threads, num_grabs = 16, 200
+	barrier = threading.Barrier(num_threads)
+	errors = []
+
+	def work(i):
+		barrier.wait()
+		try:
+			for j in range(num_grabs):
+				x, y = i * num_grabs + j, j % 7
+				ctx = Context(kit)
+				ctx['x'] = x
+				ctx['y'] = y
+				assert ctx.grab('b', None) == (None if x % 3 == 0 else (x + 1) * y)
+				ctx = Context(gate)
+				ctx['x'] = 3 * x + 1
+				ctx['y'] = y
+				assert ctx['c'] == (3 * x + 2) * y
+				assert shared['b'] == 4
+		except Exception as e:
+			errors.append(e)
+
+	threads = [threading.Thread(target=work, args=(i,)) for i in range(num_threads)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert not errors, errors[:3]
+	assert not kit._grab_trace and not gate._gang_stack
+
+
+
+def test_agrab():
+	import asyncio
+
+	calls = []
+	both_started = None
+
+	async def overlap():
+		# only returns once both parents are being computed at the same time (when grabbed asynchronously)
+		if both_started is not None:
+			if len(calls) == 2:
+				both_started.set()
+			await asyncio.wait_for(both_started.wait(), timeout=5)
+
+	class Kit(ToolKit):
+		@tool('a')
+		async def get_a(self, x):
+			calls.append('a')
+			await overlap()
+			return x + 1
+
+		@tool('b')
+		async def get_b(self, x):
+			calls.append('b')
+			await overlap()
+			return x + 2
+
+		@tool('c')
+		def get_c(self, a, b):
+			return a * b
+
+	async def main():
+		nonlocal both_started
+		both_started = asyncio.Event()
+		ctx = Context(Kit())
+		ctx['x'] = 1
+		c, a = await ctx.agrab_many('c', 'a') # (parents are awaited concurrently, otherwise this times out)
+		return ctx, c, a
+
+	ctx, c, a = asyncio.run(main())
+	assert (c, a) == (6, 2)
+	assert sorted(calls) == ['a', 'b'] # no duplicate computation
+	assert ctx['c'] == 6 and ctx.is_cached('b')
+
+	both_started = None
+	ctx = Context(Kit())
+	ctx['x'] = 2
+	assert ctx['c'] == 12 # async tools also work synchronously (outside an event loop)
+
+	async def missing():
+		ctx = Context(Kit())
+		return await ctx.agrab('c', 'none')
+
+	assert asyncio.run(missing()) == 'none'
+
+	class Defaults(ToolKit):
+		@tool('d')
+		def get_d(self, x, scale=3):
+			return x * scale
+
+	async def defaults():
+		return await Context(Defaults(), x=2).agrab('d')
+
+	assert asyncio.run(defaults()) == Context(Defaults(), x=2)['d'] == 6 # missing parents use their default
+
+	from .genetics import GeneticGadget
+	class Unknown(GeneticGadget): # (genes without any known parents)
+		def gizmos(self):
+			yield 'k'
+		def grab_from(self, ctx, gizmo):
+			return 7
+
+	assert asyncio.run(Context(Unknown()).agrab('k')) == 7
+
+
+
+def test_parallel_context():
+	import time, threading
+	from concurrent.futures import ThreadPoolExecutor
+	from .op import ParallelContext
+	from .concurrency import ParallelGame
+
+	calls = []
+	threads = set()
+	branches = threading.Barrier(3, timeout=5) # only passes once all three branches are running at the same time
+
+	class Kit(ToolKit):
+		@tool('shared')
+		def get_shared(self, x):
+			calls.append('shared')
+			time.sleep(0.05)
+			return x * 10
+
+		@tool('a')
+		def get_a(self, shared):
+			threads.add(threading.get_ident())
+			branches.wait()
+			return shared + 1
+
+		@tool('b')
+		def get_b(self, shared):
+			threads.add(threading.get_ident())
+			branches.wait()
+			return shared + 2
+
+		@tool('c')
+		def get_c(self, x):
+			threads.add(threading.get_ident())
+			branches.wait()
+			return x + 3
+
+		@tool('out')
+		def get_out(self, a, b, c):
+			return a + b + c
+
+	with ThreadPoolExecutor(4) as pool:
+		ctx = ParallelContext(Kit(), executor=pool)
+		ctx['x'] = 1
+		assert ctx['out'] == 11 + 12 + 4 # (the three branches overlap, otherwise the barrier breaks)
+	assert calls == ['shared'] # shared dependencies are computed only once
+	assert len(threads) > 1
+
+	# the trace is the same as when grabbing sequentially
+	ctx.purge('shared')
+	assert not ctx.is_cached('a') and not ctx.is_cached('out') and ctx.is_cached('c')
+	ctx.undo('c')
+	assert not ctx.is_cached('c') and ctx.is_cached('x')
+
+	ctx = ParallelContext(Kit())
+	assert ctx.grab('out', None) is None # failures are still reported as usual
+
+	from .genetics import GeneticGadget
+	class Unknown(GeneticGadget): # (genes without any known parents)
+		def gizmos(self):
+			yield 'k'
+		def grab_from(self, ctx, gizmo):
+			return 7
+
+	assert ParallelContext(Unknown())['k'] == 7
+
+	# tools offloaded to threads don't compete with the fan-out for workers (even if the fan-in is wider than the pool)
+	class Offloaded(ToolKit):
+		@tool('total')
+		def get_total(self, p1, p2, p3, p4):
+			return p1 + p2 + p3 + p4
+
+	def offloaded(i):
+		@tool(f'p{i}', executor='thread')
+		def get_p(x):
+			return x + i
+		return get_p
+
+	parents = [offloaded(i) for i in range(1, 5)]
+	shared, ParallelGame._shared_executor = ParallelGame._shared_executor, ThreadPoolExecutor(2)
+	try:
+		ctx = ParallelContext(Offloaded(), *parents, x=1)
+		result = []
+		worker = threading.Thread(target=lambda: result.append(ctx['total']), daemon=True)
+		worker.start()
+		worker.join(timeout=5)
+		assert result == [14]
+	finally:
+		ParallelGame._shared_executor.shutdown(wait=False)
+		ParallelGame._shared_executor = shared
+
+
+
+@tool('offloaded', executor='process')
+def _offloaded_tool(x):
+	import os
+	return x + 1, os.getpid()
+
+
+
+class _OffloadedKit(ToolKit):
+	@tool('y', executor='process')
+	def f(self, x):
+		return x * 2
+
+
+
+def test_offload():
+	import os, pickle
+	from concurrent.futures import ThreadPoolExecutor
+
+	ctx = Context(_offloaded_tool, _OffloadedKit())
+	ctx['x'] = 1
+	value, pid = ctx['offloaded']
+	assert value == 2 and pid != os.getpid()
+	assert ctx['y'] == 2 # the kit is sent along with the method
+
+	with ThreadPoolExecutor(1) as pool:
+		@tool('z', executor=pool)
+		def g(y):
+			return y + 1
+
+		ctx = Context(_OffloadedKit(), g)
+		ctx['x'] = 3
+		assert ctx['z'] == 7
+
+	# kits remain picklable after use
+	kit = _OffloadedKit()
+	Context(kit, x=1)
+	ctx = Context(pickle.loads(pickle.dumps(kit)))
+	ctx['x'] = 10
+	assert ctx['y'] == 20
+
+	# so are contexts (including their cache)
+	ctx = pickle.loads(pickle.dumps(ctx))
+	assert ctx.is_cached('y') and ctx['y'] == 20
+	ctx['x'] = 5
+	assert ctx['y'] == 10
+
+
+
+def test_grab_many():
+	from .batching import grab_many
+
+	calls = []
+
+	class Kit(ToolKit):
+		@tool('y')
+		def f(self, x):
+			calls.append('y')
+			return x + 1
+
+		@tool('z', batched=True)
+		def g(self, y):
+			calls.append('z')
+			assert len(y) in (1, 3) # stacked for all contexts missing z at once (or a single one)
+			return [v * 10 for v in y]
+
+		@tool('p', 'q', batched=True)
+		def h(self, z, w=1):
+			return [a + b for a, b in zip(z, w)], [a - b for a, b in zip(z, w)] # (defaults are stacked too)
+
+	kit = Kit()
+	contexts = [Context(kit) for _ in range(4)]
+	for i, ctx in enumerate(contexts):
+		ctx['x'] = i
+	contexts[2]['z'] = -1 # already cached
+
+	assert grab_many(contexts, 'z') == [10, 20, -1, 40]
+	assert calls.count('z') == 1 and calls.count('y') == 3
+	assert [ctx['y'] for ctx in contexts if ctx.is_cached('y')] == [1, 2, 4]
+	assert Context.grab_many(contexts, 'q') == [9, 19, -2, 39]
+	assert [ctx['p'] for ctx in contexts] == [11, 21, 0, 41]
+
+	# the trace is kept as usual
+	contexts[0]['x'] = 5
+	assert contexts[0]['q'] == 59
+
+	# batched tools also work on their own (as a batch of size 1)
+	ctx = Context(kit)
+	ctx['x'] = 1
+	assert ctx['p'] == 21
+
+	# failures fall back to the regular grab
+	missing = [Context(kit), contexts[1]]
+	assert grab_many(missing, 'z', default=None) == [None, 20]
+
+	from .genetics import GeneticGadget
+	class Unknown(GeneticGadget): # batched, but its genes have no known parents
+		_batched = True
+		def gizmos(self):
+			yield 'k'
+		def grab_from(self, ctx, gizmo):
+			return 7
+		def grab_batch_from(self, contexts, gizmo):
+			return [7] * len(contexts)
+
+	unknown = Unknown()
+	assert grab_many([Context(unknown), Context(unknown)], 'k') == [7, 7]
+
+
+
+def test_vectorized():
+	class Stacked(Context):
+		def _stacked_size(self):
+			return self.grab('size')
+
+	class Kit(ToolKit):
+		@tool('even', vectorized=True)
+		def is_even(self, index):
+			assert isinstance(index, int)
+			return index % 2 == 0
+
+		@tool('shifted', vectorized=['index'])
+		def shift(self, index, offset):
+			return index + offset
+
+		@tool('total', batched=True)
+		def get_total(self, index, offset):
+			return [i + o for i, o in zip(index, offset)]
+
+	kit = Kit()
+	batch = Stacked(kit)
+	batch.update({'size': 3, 'index': [0, 1, 2], 'offset': 10})
+	assert list(batch['even']) == [True, False, True]
+	assert list(batch['shifted']) == [10, 11, 12]
+
+	# per-sample tools are called directly on a single sample (and batched tools on a batch of size 1)
+	sample = Context(kit)
+	sample.update({'index': 3, 'offset': 10})
+	assert sample['even'] is False and sample['shifted'] == 13 and sample['total'] == 13
+
+
 
 # def test_guard():
 # 	@tool('x')
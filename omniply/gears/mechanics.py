@@ -60,6 +60,14 @@ class MutableMechanized(MechanizedGaggle, MutableGaggle):
 		return out
 
 
+	def _share_vendors(self, source: MutableGaggle, *, skip: Iterable[AbstractGadget] = ()):
+		if self._mechanics is None:
+			return super()._share_vendors(source, skip=skip)
+		# new vendors must also be added to the mechanics
+		skip = {id(gadget) for gadget in skip}
+		return self.extend([gadget for gadget in source.vendors() if id(gadget) not in skip])
+
+
 
 class MechanizedGame(AutoMechanized, MutableMechanized):
 	'''for games'''